@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""Measure how add_docs.process scales with the number and kind of workers."""
+import logging
+import os
+import sys
+import time
+
+from argparse import ArgumentParser
+from pathlib import Path
+
+from collection_prep.cmd.add_docs import process
+from collection_prep.docs_batch import add_collection
+from collection_prep.docs_batch import load_galaxy
+from collection_prep.docs_manifest import MANIFEST_NAME
+
+
+def snapshot(path):
+    """Read every rst file in the docs directory.
+
+    :param path: The path to the collection
+    :return: A mapping of rst file names to their contents
+    """
+    return {entry.name: entry.read_bytes() for entry in Path(path, "docs").glob("*.rst")}
+
+
+def main():
+    """Run the benchmark."""
+    parser = ArgumentParser()
+    parser.add_argument("-p", "--path", help="The path to the collection", required=True)
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        nargs="+",
+        default=sorted({1, 2, 4, os.cpu_count() or 1}),
+        help="The worker counts to measure",
+    )
+    parser.add_argument(
+        "--pool",
+        nargs="+",
+        choices=["process", "thread"],
+        default=["process", "thread"],
+        help="The kinds of worker pool to measure",
+    )
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    path = Path(args.path).absolute()
+    galaxy = load_galaxy(path=path)
+    collection = f"{galaxy['namespace']}.{galaxy['name']}"
+    add_collection(path, galaxy)
+
+    baseline = None
+    serial = None
+    print(f"{'pool':>8} {'jobs':>6} {'seconds':>10} {'speedup':>8}")
+    runs = [("serial", 1)] + [(pool, jobs) for pool in args.pool for jobs in args.jobs if jobs > 1]
+    for pool, jobs in runs:
+        # Without a manifest every plugin is extracted and rendered again
+        Path(path, "docs", MANIFEST_NAME).unlink(missing_ok=True)
+        start = time.perf_counter()
+        content = process(collection=collection, path=path, jobs=jobs, pool=pool)
+        elapsed = time.perf_counter() - start
+        result = (repr(content), snapshot(path))
+        if baseline is None:
+            baseline, serial = result, elapsed
+        elif result != baseline:
+            sys.exit(f"Output with {jobs} {pool} jobs differs from the serial run")
+        print(f"{pool:>8} {jobs:>6} {elapsed:>10.2f} {serial / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
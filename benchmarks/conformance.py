@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+"""Check the engines of add_docs extract the same docs as ansible-core, and time them."""
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from argparse import ArgumentParser
+from pathlib import Path
+
+from collection_prep.cmd.add_docs import extract_plugin
+from collection_prep.docs_batch import add_collections
+from collection_prep.docs_batch import load_galaxy
+from collection_prep.docs_manifest import IGNORE_FILES
+from collection_prep.docs_manifest import SUBDIRS
+from collection_prep.fragment_resolver import FragmentResolver
+
+
+# What each engine imports before it can read a plugin file
+IMPORTS = {
+    "ansible": "from ansible.utils import plugin_docs",
+    "lite": "from collection_prep import lite_extractor; import yaml",
+}
+
+
+def plugin_files(paths, ansible_core):
+    """List the plugin files to check.
+
+    :param paths: The path to each collection
+    :param ansible_core: Whether to check the modules and plugins of ansible-core too
+    :return: The plugin files
+    """
+    files = []
+    for path in paths:
+        for subdir in SUBDIRS:
+            files.extend(sorted(Path(path, "plugins", subdir).glob("*.py")))
+    if ansible_core:
+        import ansible  # pylint: disable-msg=import-outside-toplevel
+
+        root = Path(ansible.__file__).parent
+        files.extend(sorted(Path(root, "modules").glob("*.py")))
+        for subdir in sorted(Path(root, "plugins").iterdir()):
+            if subdir.name != "doc_fragments" and subdir.is_dir():
+                files.extend(sorted(subdir.glob("*.py")))
+    return [fullpath for fullpath in files if fullpath.name not in IGNORE_FILES]
+
+
+def reference(fullpath):
+    """Extract the documentation of a plugin file with ansible-core's plugin_docs alone.
+
+    :param fullpath: The plugin file
+    :return: The documentation, or the error raised, normalized to JSON types
+    """
+    from ansible.utils import plugin_docs  # pylint: disable-msg=import-outside-toplevel
+
+    try:
+        data = plugin_docs.read_docstring(os.fspath(fullpath), verbose=False, ignore_errors=False)
+        if data.get("doc", False):
+            plugin_docs.add_fragments(
+                data["doc"], os.fspath(fullpath), fragment_loader=FragmentResolver.installed()
+            )
+    except Exception as exc:  # pylint: disable-msg=broad-exception-caught
+        return {"error": type(exc).__name__}
+    return json.loads(json.dumps(data, default=str))
+
+
+def extract(fullpath, engine):
+    """Extract the documentation of a plugin file with an engine and time it.
+
+    :param fullpath: The plugin file
+    :param engine: The engine, one of add_docs.ENGINES
+    :return: The documentation, or the error raised, normalized to JSON types, and the time
+        taken in seconds
+    """
+    start = time.perf_counter()
+    try:
+        data, _fragments = extract_plugin(fullpath, engine=engine)
+        result = json.loads(json.dumps(data, default=str))
+    except Exception as exc:  # pylint: disable-msg=broad-exception-caught
+        result = {"error": type(exc).__name__}
+    return result, time.perf_counter() - start
+
+
+def import_time(engine, runs):
+    """Time a fresh interpreter importing what an engine needs.
+
+    :param engine: The engine, one of add_docs.ENGINES
+    :param runs: The number of times to measure
+    :return: The fastest time in seconds
+    """
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", IMPORTS[engine]], check=True)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    """Run the benchmark."""
+    parser = ArgumentParser()
+    parser.add_argument(
+        "-p", "--path", action="append", default=[], help="The path to a collection to check"
+    )
+    parser.add_argument(
+        "--ansible-core",
+        dest="ansible_core",
+        action="store_true",
+        help="Also check the modules and plugins shipped with ansible-core",
+    )
+    parser.add_argument(
+        "-n", "--runs", type=int, default=5, help="Runs per import time measurement"
+    )
+    args = parser.parse_args()
+    if not args.path and not args.ansible_core:
+        parser.error("give a collection path or --ansible-core")
+    logging.disable(logging.INFO)
+
+    paths = [Path(path).absolute() for path in args.path]
+    add_collections([(path, load_galaxy(path=path)) for path in paths])
+
+    totals = {"ansible": 0.0, "lite": 0.0}
+    mismatches = []
+    files = plugin_files(paths, args.ansible_core)
+    for fullpath in files:
+        expected = reference(fullpath)
+        for engine in totals:
+            result, elapsed = extract(fullpath, engine)
+            totals[engine] += elapsed
+            if result != expected and not ("error" in result and "error" in expected):
+                mismatches.append(fullpath)
+                print(f"MISMATCH {engine} {fullpath}")
+
+    print(f"{len(files)} plugin files, {len(mismatches)} mismatches")
+    print(f"{'engine':>8} {'import ms':>10} {'per file ms':>12}")
+    for engine, total in totals.items():
+        print(
+            f"{engine:>8} {import_time(engine, args.runs) * 1000:>10.0f}"
+            f" {total / max(len(files), 1) * 1000:>12.2f}"
+        )
+    sys.exit(int(bool(mismatches)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""Compare the single-pass markup converter with the substitution chain."""
+# pylint: disable-msg=protected-access
+import ast
+import sys
+import timeit
+
+from argparse import ArgumentParser
+from html import escape as html_escape
+from pathlib import Path
+
+import yaml
+
+from collection_prep import jinja_utils
+
+
+def doc_strings(path):
+    """Read the documentation strings of a python file.
+
+    :param path: The path to the plugin or doc fragment
+    :return: The parsed DOCUMENTATION and RETURN sections found in the file
+    """
+    tree = ast.parse(path.read_text(encoding="utf8"))
+    sections = []
+    for node in ast.walk(tree):
+        if (
+            isinstance(node, ast.Assign)
+            and isinstance(node.value, ast.Constant)
+            and isinstance(node.value.value, str)
+            and any(
+                getattr(target, "id", "") in ("DOCUMENTATION", "RETURN") for target in node.targets
+            )
+        ):
+            try:
+                sections.append(yaml.safe_load(node.value.value))
+            except yaml.YAMLError:
+                continue
+    return sections
+
+
+def flatten(data):
+    """Collect every string in a documentation structure.
+
+    :param data: The parsed documentation
+    :return: The strings found, in document order
+    """
+    if isinstance(data, str):
+        return [data]
+    if isinstance(data, dict):
+        return [text for value in data.values() for text in flatten(value)]
+    if isinstance(data, list):
+        return [text for value in data for text in flatten(value)]
+    return []
+
+
+def collect(path):
+    """Collect the strings rendered for each plugin, including the fragments it extends.
+
+    :param path: The path to the collection
+    :return: The strings in the order the plugins would render them
+    """
+    galaxy = yaml.safe_load(Path(path, "galaxy.yml").read_text(encoding="utf8"))
+    prefix = f"{galaxy['namespace']}.{galaxy['name']}."
+    fragments = {
+        prefix + entry.stem: doc_strings(entry)
+        for entry in Path(path, "plugins", "doc_fragments").glob("*.py")
+    }
+    texts = []
+    for entry in sorted(Path(path, "plugins").glob("*/*.py")):
+        if entry.parent.name == "doc_fragments":
+            continue
+        for section in doc_strings(entry):
+            texts.extend(flatten(section))
+            if isinstance(section, dict):
+                extends = section.get("extends_documentation_fragment") or []
+                for name in [extends] if isinstance(extends, str) else extends:
+                    for fragment in fragments.get(name, []):
+                        texts.extend(flatten(fragment))
+    return texts
+
+
+def main():
+    """Run the benchmark."""
+    parser = ArgumentParser()
+    parser.add_argument("-p", "--path", help="The path to the collection", required=True)
+    parser.add_argument("-n", "--number", type=int, default=5, help="Repetitions per timing")
+    args = parser.parse_args()
+
+    texts = collect(args.path)
+    print(f"{len(texts)} strings, {len(set(texts))} unique")
+
+    for text in texts:
+        if jinja_utils.rst_ify(text) != jinja_utils._rst_ify_chain(text):
+            sys.exit(f"rst_ify output differs for {text!r}")
+        if jinja_utils.html_ify(text) != jinja_utils._html_ify_chain(html_escape(text)).strip():
+            sys.exit(f"html_ify output differs for {text!r}")
+
+    def chain():
+        for text in texts:
+            jinja_utils._rst_ify_chain(text)
+            jinja_utils._html_ify_chain(html_escape(text)).strip()
+
+    def single_pass():
+        for text in texts:
+            jinja_utils._rst_ify.__wrapped__(text)
+            jinja_utils._html_ify.__wrapped__(text)
+
+    def cold():
+        jinja_utils._rst_ify.cache_clear()
+        jinja_utils._html_ify.cache_clear()
+        warm()
+
+    def warm():
+        for text in texts:
+            jinja_utils.rst_ify(text)
+            jinja_utils.html_ify(text)
+
+    print(f"{'converter':>20} {'seconds':>10}")
+    for name, func in (
+        ("substitution chain", chain),
+        ("single pass", single_pass),
+        ("cached, cold", cold),
+        ("cached, warm", warm),
+    ):
+        elapsed = min(timeit.repeat(func, number=1, repeat=args.number))
+        print(f"{name:>20} {elapsed:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""Compare reading DOCUMENTATION with RedBaron and with the stdlib ast module."""
+import logging
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from pathlib import Path
+
+from synthetic import generate
+
+from collection_prep.cmd import runtime
+from collection_prep.utils import find_assignment_in_ast
+from collection_prep.utils import load_py_as_ast
+from collection_prep.utils import read_assignments
+
+
+def with_redbaron(paths):
+    """Read DOCUMENTATION from each module with a lossless RedBaron parse.
+
+    :param paths: The module files
+    :return: The DOCUMENTATION of each module
+    """
+    return [
+        find_assignment_in_ast(
+            ast_file=load_py_as_ast(path), name="DOCUMENTATION"
+        ).value.to_python()
+        for path in paths
+    ]
+
+
+def with_ast(paths):
+    """Read DOCUMENTATION from each module with the stdlib ast module.
+
+    :param paths: The module files
+    :return: The DOCUMENTATION of each module
+    """
+    return [read_assignments(path, {"DOCUMENTATION"})["DOCUMENTATION"] for path in paths]
+
+
+def main():
+    """Run the benchmark."""
+    parser = ArgumentParser()
+    parser.add_argument("-n", "--modules", type=int, default=300, help="The number of modules")
+    parser.add_argument("-d", "--depth", type=int, default=2, help="The suboption nesting depth")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as root:
+        collection, path = generate(root, args.modules, fragments=5, depth=args.depth)
+        paths = sorted(Path(path, "plugins", "modules").glob("*.py"))
+
+        timings = {}
+        results = {}
+        for name, func in (("redbaron", with_redbaron), ("ast", with_ast)):
+            start = time.perf_counter()
+            results[name] = func(paths)
+            timings[name] = time.perf_counter() - start
+        if results["redbaron"] != results["ast"]:
+            sys.exit("DOCUMENTATION read with ast differs from RedBaron")
+
+        start = time.perf_counter()
+        runtime.process(collection=collection, path=root)
+        timings["runtime.process"] = time.perf_counter() - start
+
+    print(f"{len(paths)} modules")
+    print(f"{'reader':>16} {'seconds':>10} {'ms/module':>10}")
+    for name, elapsed in timings.items():
+        print(f"{name:>16} {elapsed:>10.2f} {elapsed * 1000 / len(paths):>10.2f}")
+    print(f"ast is {timings['redbaron'] / timings['ast']:.0f}x faster than RedBaron")
+
+
+if __name__ == "__main__":
+    main()
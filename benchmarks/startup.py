@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+"""Measure the startup time of each console script."""
+import statistics
+import subprocess
+import sys
+import time
+
+from argparse import ArgumentParser
+
+
+COMMANDS = ("add_docs", "update", "runtime", "version")
+
+
+def measure(args, runs):
+    """Time running a python command.
+
+    :param args: The arguments to the python interpreter
+    :param runs: The number of times to run it
+    :return: The wall time of each run in seconds
+    """
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    """Run the benchmark."""
+    parser = ArgumentParser()
+    parser.add_argument("-n", "--runs", type=int, default=10, help="Runs per command")
+    args = parser.parse_args()
+
+    baseline = min(measure(["-c", "pass"], args.runs))
+    print(f"interpreter startup {baseline * 1000:.0f} ms")
+    print(f"{'command':>10} {'min ms':>8} {'median ms':>10}")
+    for command in COMMANDS:
+        timings = measure(["-m", f"collection_prep.cmd.{command}", "--help"], args.runs)
+        print(
+            f"{command:>10} {min(timings) * 1000:>8.0f} {statistics.median(timings) * 1000:>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
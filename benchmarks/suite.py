@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+"""Run every collection_prep stage against synthetic collections of several sizes.
+
+Each stage runs in a fresh interpreter against a freshly generated collection, so
+import caches, the collection finder and earlier stages don't skew the numbers.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from synthetic import generate
+
+
+STAGES = ("add_docs", "add_docs_unchanged", "runtime", "version", "update")
+
+
+def stage_callable(stage, collection, root, path, jobs):
+    """Prepare a stage so only the work being measured is left to run.
+
+    :param stage: The stage to run
+    :param collection: The collection name
+    :param root: The directory containing the collection
+    :param path: The path to the collection
+    :param jobs: The number of add_docs workers
+    :return: A function running the stage
+    """
+    # pylint: disable-msg=import-outside-toplevel
+    from collection_prep.cmd import add_docs
+    from collection_prep.cmd import runtime
+    from collection_prep.cmd import update
+    from collection_prep.cmd import version
+
+    if stage.startswith("add_docs"):
+        add_docs.add_collection(path, add_docs.load_galaxy(path=path))
+        if stage == "add_docs_unchanged":
+            add_docs.process(collection=collection, path=path, jobs=jobs)
+        return lambda: add_docs.process(collection=collection, path=path, jobs=jobs)
+    if stage == "runtime":
+        return lambda: runtime.process(collection=collection, path=root)
+    if stage == "version":
+        return lambda: version.update_version(path, version.get_last_version(path))
+    return lambda: update.process(collection=collection, path=f"{root}/")
+
+
+def run_stage(stage, sizes, jobs):
+    """Generate a collection and time one stage against it.
+
+    :param stage: The stage to run
+    :param sizes: The keyword arguments for the generator
+    :param jobs: The number of add_docs workers
+    :return: The wall and CPU seconds and the peak memory of the stage
+    """
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as root:
+        collection, path = generate(root, **sizes)
+        func = stage_callable(stage, collection, root, path, jobs)
+        before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu = time.process_time()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        "seconds": round(elapsed, 4),
+        "cpu_seconds": round(cpu, 4),
+        # black and add_docs workers run in child processes
+        "child_cpu_seconds": round(
+            after.ru_utime + after.ru_stime - before.ru_utime - before.ru_stime, 4
+        ),
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def collection_sizes(plugins, args):
+    """Split a plugin count into generator arguments.
+
+    :param plugins: The total number of plugins
+    :param args: The parsed command line
+    :return: The keyword arguments for the generator
+    """
+    simple = round(plugins * args.simple_ratio)
+    return {
+        "modules": plugins - simple,
+        "simple": simple,
+        "fragments": max(1, plugins // args.plugins_per_fragment),
+        "depth": args.depth,
+        "changelogs": max(1, plugins // 10),
+    }
+
+
+def main():
+    """Run the benchmark suite."""
+    parser = ArgumentParser()
+    parser.add_argument(
+        "-s",
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10, 500, 5000],
+        help="The total plugin counts to measure",
+    )
+    parser.add_argument(
+        "--stages", nargs="+", choices=STAGES, default=list(STAGES), help="The stages to measure"
+    )
+    parser.add_argument("-r", "--runs", type=int, default=1, help="Runs per stage and size")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="The number of add_docs workers")
+    parser.add_argument("-d", "--depth", type=int, default=2, help="The suboption nesting depth")
+    parser.add_argument(
+        "--simple-ratio", type=float, default=0.1, help="The share of filter and test plugin files"
+    )
+    parser.add_argument(
+        "--plugins-per-fragment", type=int, default=50, help="How many plugins share a doc fragment"
+    )
+    parser.add_argument("-o", "--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'stage':>20} {'plugins':>8} {'seconds':>10} {'ms/plugin':>10}")
+    context = multiprocessing.get_context("spawn")
+    for plugins in args.sizes:
+        sizes = collection_sizes(plugins, args)
+        for stage in args.stages:
+            runs = []
+            for _ in range(args.runs):
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    runs.append(executor.submit(run_stage, stage, sizes, args.jobs).result())
+            best = min(runs, key=lambda run: run["seconds"])
+            results.append({"stage": stage, "plugins": plugins, **sizes, **best, "runs": runs})
+            print(
+                f"{stage:>20} {plugins:>8} {best['seconds']:>10.2f}"
+                f" {best['seconds'] * 1000 / plugins:>10.2f}"
+            )
+
+    if args.output:
+        report = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "jobs": args.jobs,
+            "results": results,
+        }
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n", encoding="utf8")
+        print(f"Results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+"""Generate a synthetic collection to benchmark collection_prep against."""
+import os
+
+from argparse import ArgumentParser
+from pathlib import Path
+
+
+NAMESPACE = "acme"
+NAME = "bench"
+RESOURCE_RETURN = """
+after:
+  description: The configuration after the module ran.
+  returned: when changed
+  type: dict
+before:
+  description: The configuration before the module ran.
+  returned: always
+  type: dict
+commands:
+  description: The commands sent to the device.
+  returned: always
+  type: list
+  sample: ["interface Ethernet1"]
+"""
+CHANGELOG_SECTIONS = ("minor_changes", "bugfixes", "trivial", "deprecated_features")
+
+
+def nested_options(depth, indent=2):
+    """Build a YAML options block with suboptions nested to a given depth.
+
+    :param depth: How many levels of suboptions to nest
+    :param indent: The indentation of the block
+    :return: The YAML lines
+    """
+    pad = " " * indent
+    lines = [
+        f"{pad}name:",
+        f"{pad}  description:",
+        f"{pad}  - The B(name) of the entry, see I(state) and C(present).",
+        f"{pad}  - Refer to L(the guide,https://docs.example.com/guide)"
+        f" or M({NAMESPACE}.{NAME}.{NAME}_thing0).",
+        f"{pad}  type: str",
+        f"{pad}  required: true",
+        f"{pad}state:",
+        f"{pad}  description: Whether the entry should exist.",
+        f"{pad}  type: str",
+        f"{pad}  choices: [present, absent]",
+        f"{pad}  default: present",
+        f"{pad}  version_added: 1.1.0",
+    ]
+    if depth:
+        lines += [
+            f"{pad}config:",
+            f"{pad}  description: A level of nested configuration.",
+            f"{pad}  type: list",
+            f"{pad}  elements: dict",
+            f"{pad}  suboptions:",
+        ]
+        lines += nested_options(depth - 1, indent + 4)
+    return lines
+
+
+def module_source(index, fragments, depth):
+    """Build the source of a module.
+
+    Every fifth module is a resource module and every tenth is deprecated.
+
+    :param index: The module number
+    :param fragments: The number of doc fragments in the collection
+    :param depth: How many levels of suboptions to nest
+    :return: The python source
+    """
+    name = f"{NAME}_thing{index}"
+    extends = ""
+    if fragments:
+        extends = (
+            f"extends_documentation_fragment:\n- {NAMESPACE}.{NAME}.fragment{index % fragments}\n"
+        )
+    deprecated = ""
+    if index % 10 == 9:
+        deprecated = (
+            'deprecated:\n  removed_in: "3.0.0"\n  why: Replaced.\n'
+            "  alternative: Use something else.\n"
+        )
+    returns = (
+        RESOURCE_RETURN
+        if index % 5 == 0
+        else "\nchanged:\n  description: Whether it changed.\n  returned: always\n  type: bool\n"
+    )
+    options = "\n".join(nested_options(depth))
+    return f'''#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+
+__metaclass__ = type
+
+ANSIBLE_METADATA = {{"metadata_version": "1.1", "status": ["preview"], "supported_by": "network"}}
+
+DOCUMENTATION = """
+module: {name}
+short_description: Manage thing {index} with C(code)
+description:
+- Manages I(thing) number {index} on the device.
+- HORIZONTALLINE
+version_added: 1.0.0
+author: Someone (@someone)
+notes:
+- Tested against version U(https://example.com/{index}).
+{extends}options:
+{options}
+{deprecated}"""
+
+EXAMPLES = """
+# Use {name} to create a thing
+- name: Create thing {index}
+  {name}:
+    name: thing{index}
+    state: present
+
+- name: Remove thing {index}
+  {name}:
+    name: thing{index}
+    state: absent
+"""
+
+RETURN = """{returns}"""
+
+
+def main():
+    """Run the module."""
+
+
+if __name__ == "__main__":
+    main()
+'''
+
+
+def fragment_source(index, depth):
+    """Build the source of a doc fragment.
+
+    :param index: The fragment number
+    :param depth: How many levels of suboptions to nest
+    :return: The python source
+    """
+    options = "\n".join(nested_options(depth, indent=4))
+    return f'''# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+
+__metaclass__ = type
+
+
+class ModuleDocFragment(object):
+    DOCUMENTATION = r"""
+options:
+  provider{index}:
+    description:
+    - Connection details shared by the modules using fragment {index}.
+    type: dict
+    suboptions:
+{options}
+"""
+'''
+
+
+def simple_source(index, kind, count=3):
+    """Build the source of a filter or test plugin file.
+
+    :param index: The plugin file number
+    :param kind: filter or test
+    :param count: The number of plugins in the file
+    :return: The python source
+    """
+    class_name = "FilterModule" if kind == "filter" else "TestModule"
+    method = "filters" if kind == "filter" else "tests"
+    functions = "".join(
+        f"\n\ndef {kind}_{index}_{number}(value):\n"
+        f'    """Return the value, {kind} {number}."""\n    return value\n'
+        for number in range(count)
+    )
+    entries = "".join(
+        f'            "{kind}_{index}_{number}": {kind}_{index}_{number},\n'
+        for number in range(count)
+    )
+    return f'''# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+
+__metaclass__ = type
+{functions}
+
+class {class_name}(object):
+    """Synthetic {kind} plugins {index}."""
+
+    def {method}(self):
+        return {{
+{entries}        }}
+'''
+
+
+def write(path, text):
+    """Write a file, creating its directory.
+
+    :param path: The file path
+    :param text: The content
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf8")
+
+
+def generate(
+    root, modules, simple=0, fragments=1, depth=1, changelogs=0
+):  # pylint: disable-msg=too-many-arguments,too-many-positional-arguments
+    """Generate a synthetic collection.
+
+    :param root: The directory to create the collection in
+    :param modules: The number of modules
+    :param simple: The number of filter and test plugin files, split evenly
+    :param fragments: The number of doc fragments
+    :param depth: How many levels of suboptions to nest in each option block
+    :param changelogs: The number of changelog fragments
+    :return: The collection name and the path to the collection
+    """
+    collection = f"{NAMESPACE}.{NAME}"
+    path = Path(root, collection)
+    write(
+        path / "galaxy.yml",
+        f"namespace: {NAMESPACE}\nname: {NAME}\nversion: 1.0.0\n"
+        f"repository: https://github.com/{NAMESPACE}/{collection}.git\n",
+    )
+    write(path / "meta" / "runtime.yml", "---\nrequires_ansible: '>=2.14.0'\n")
+    write(
+        path / "README.md",
+        f"# {collection}\n\n<!--start requires_ansible-->\n<!--end requires_ansible-->\n\n"
+        "<!--start collection content-->\n<!--end collection content-->\n",
+    )
+    write(
+        path / "changelogs" / "changelog.yaml",
+        "ancestor: null\nreleases:\n  1.0.0:\n    release_date: '2023-01-01'\n",
+    )
+    (path / "docs").mkdir(exist_ok=True)
+    write(path / "plugins" / "action" / f"{NAME}.py", "class ActionModule(object):\n    pass\n")
+    for index in range(fragments):
+        write(
+            path / "plugins" / "doc_fragments" / f"fragment{index}.py",
+            fragment_source(index, depth),
+        )
+    for index in range(modules):
+        write(
+            path / "plugins" / "modules" / f"{NAME}_thing{index}.py",
+            module_source(index, fragments, depth),
+        )
+    for index in range(simple):
+        kind = "filter" if index % 2 == 0 else "test"
+        write(path / "plugins" / kind / f"{kind}{index}.py", simple_source(index, kind))
+    for index in range(changelogs):
+        section = CHANGELOG_SECTIONS[index % len(CHANGELOG_SECTIONS)]
+        write(
+            path / "changelogs" / "fragments" / f"{index}-change.yaml",
+            f"---\n{section}:\n  - {NAME}_thing{index} - change number {index}.\n",
+        )
+    return collection, path
+
+
+def main():
+    """Generate a collection from the command line."""
+    parser = ArgumentParser()
+    parser.add_argument(
+        "-p", "--path", help="The directory to create the collection in", required=True
+    )
+    parser.add_argument("-n", "--modules", type=int, default=100, help="The number of modules")
+    parser.add_argument(
+        "-m", "--simple", type=int, default=10, help="The number of filter/test files"
+    )
+    parser.add_argument(
+        "-k", "--fragments", type=int, default=5, help="The number of doc fragments"
+    )
+    parser.add_argument("-d", "--depth", type=int, default=2, help="The suboption nesting depth")
+    parser.add_argument(
+        "-c", "--changelogs", type=int, default=10, help="The number of changelog fragments"
+    )
+    args = parser.parse_args()
+    os.makedirs(args.path, exist_ok=True)
+    _collection, path = generate(
+        args.path, args.modules, args.simple, args.fragments, args.depth, args.changelogs
+    )
+    print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""Measure how update.process scales with the number of worker processes."""
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from pathlib import Path
+
+from synthetic import generate
+
+from collection_prep.cmd.update import process
+
+
+def snapshot(path):
+    """Read every plugin file of the collection.
+
+    :param path: The path to the collection
+    :return: A mapping of plugin files to their contents
+    """
+    return {
+        entry.relative_to(path).as_posix(): entry.read_bytes()
+        for entry in Path(path, "plugins").rglob("*.py")
+    }
+
+
+def main():
+    """Run the benchmark."""
+    parser = ArgumentParser()
+    parser.add_argument("-n", "--modules", type=int, default=200, help="The number of modules")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        nargs="+",
+        default=sorted({1, 2, 4, os.cpu_count() or 1}),
+        help="The worker counts to measure",
+    )
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    baseline = None
+    serial = None
+    print(f"{args.modules} modules")
+    print(f"{'jobs':>6} {'seconds':>10} {'speedup':>8}")
+    for jobs in sorted(set(args.jobs)):
+        # update rewrites the plugins, so each run starts from a fresh collection
+        with tempfile.TemporaryDirectory() as root:
+            collection, path = generate(root, args.modules, simple=0, fragments=5, depth=2)
+            start = time.perf_counter()
+            failed, _changed = process(collection=collection, path=f"{root}/", jobs=jobs)
+            elapsed = time.perf_counter() - start
+            result = snapshot(path)
+        if failed:
+            sys.exit(f"{len(failed)} files failed to update with {jobs} jobs")
+        if baseline is None:
+            baseline, serial = result, elapsed
+        elif result != baseline:
+            sys.exit(f"Output with {jobs} jobs differs from the first run")
+        print(f"{jobs:>6} {elapsed:>10.2f} {serial / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
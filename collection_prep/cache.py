@@ -0,0 +1,241 @@
+"""A persistent cache of what the commands read from plugin files, shared across runs."""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from contextlib import contextmanager
+from functools import cache
+from pathlib import Path
+
+from collection_prep.utils import user_cache_path
+
+
+# Bump when the layout of the database or of the cached values changes
+SCHEMA_VERSION = 1
+DEFAULT_MAX_AGE_DAYS = 30
+DEFAULT_MAX_SIZE_MB = 512
+
+
+@cache
+def package_version(name):
+    """Get the installed version of a package the cached values depend on.
+
+    :param name: The distribution name of the package
+    :return: The version, or None if it isn't installed
+    """
+    from importlib import metadata  # pylint: disable-msg=import-outside-toplevel
+
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+@cache
+def code_version():
+    """Get the version of collection_prep the cached values were produced by.
+
+    The sources are hashed rather than the installed version read, so an editable
+    install or a checkout with local changes doesn't reuse values from older code.
+
+    :return: A hash of the sources and the template
+    """
+    root = Path(__file__).parent
+    sources = hashlib.sha256()
+    for path in sorted([*root.rglob("*.py"), *root.rglob("*.j2")]):
+        sources.update(path.relative_to(root).as_posix().encode("utf8"))
+        sources.update(path.read_bytes())
+    return sources.hexdigest()
+
+
+def make_key(*parts):
+    """Build a cache key from the inputs a value depends on.
+
+    The schema and collection_prep versions are always part of the key.
+
+    :param parts: The inputs, anything that can be serialized to JSON
+    :return: The key
+    """
+    text = json.dumps([SCHEMA_VERSION, code_version(), *parts], default=str)
+    return hashlib.sha256(text.encode("utf8")).hexdigest()
+
+
+class Cache:
+    """Cached values by kind and key, in a SQLite database.
+
+    Values are stored as JSON. They are written, and the time they were last used
+    recorded, when the cache is closed. Values not used for a while are removed then.
+    """
+
+    def __init__(self, path=None):
+        """Open the cache database, creating it if needed.
+
+        :param path: The database file, collection_prep/cache.sqlite3 in the user cache if not given
+        """
+        self.path = os.fspath(path or user_cache_path("cache.sqlite3"))
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries (kind TEXT, key TEXT, value TEXT,"
+            " size INTEGER, used REAL, PRIMARY KEY (kind, key))"
+        )
+        self._conn.commit()
+        self._pending = {}
+        self._used = set()
+
+    def get(self, kind, key):
+        """Get a cached value.
+
+        :param kind: The kind of value, the command or stage storing it
+        :param key: The key of the value, see make_key
+        :return: The value, or None if it is not cached
+        """
+        if (kind, key) in self._pending:
+            return json.loads(self._pending[kind, key])
+        row = self._conn.execute(
+            "SELECT value FROM entries WHERE kind = ? AND key = ?", (kind, key)
+        ).fetchone()
+        if row is None:
+            return None
+        self._used.add((kind, key))
+        return json.loads(row[0])
+
+    def put(self, kind, key, value):
+        """Cache a value.
+
+        Values that aren't JSON types, like dates, are stored as strings.
+
+        :param kind: The kind of value, the command or stage storing it
+        :param key: The key of the value, see make_key
+        :param value: The value
+        """
+        self._pending[kind, key] = json.dumps(value, default=str)
+
+    def flush(self):
+        """Write the new values and the time the others were used."""
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+            [(kind, key, text, len(text), now) for (kind, key), text in self._pending.items()],
+        )
+        self._conn.executemany(
+            "UPDATE entries SET used = ? WHERE kind = ? AND key = ?",
+            [(now, kind, key) for kind, key in self._used],
+        )
+        self._conn.commit()
+        self._pending.clear()
+        self._used.clear()
+
+    def prune(self, max_age_days=DEFAULT_MAX_AGE_DAYS, max_size_mb=DEFAULT_MAX_SIZE_MB):
+        """Remove the values not used recently, then the least recently used over the size limit.
+
+        :param max_age_days: Remove the values not used for this many days
+        :param max_size_mb: Keep the total size of the values under this many megabytes
+        :return: The number of values removed
+        """
+        self.flush()
+        removed = self._conn.execute(
+            "DELETE FROM entries WHERE used < ?", (time.time() - max_age_days * 86400,)
+        ).rowcount
+        removed += self._conn.execute(
+            "DELETE FROM entries WHERE rowid IN (SELECT rowid FROM (SELECT rowid,"
+            " SUM(size) OVER (ORDER BY used DESC, rowid) AS total FROM entries) WHERE total > ?)",
+            (max_size_mb * 1024 * 1024,),
+        ).rowcount
+        self._conn.commit()
+        return removed
+
+    def stats(self):
+        """Count the cached values.
+
+        :return: The number and total size of the values of each kind
+        """
+        self.flush()
+        return {
+            kind: {"count": count, "size": size}
+            for kind, count, size in self._conn.execute(
+                "SELECT kind, COUNT(*), SUM(size) FROM entries GROUP BY kind ORDER BY kind"
+            )
+        }
+
+    def clear(self):
+        """Remove every cached value."""
+        self._pending.clear()
+        self._used.clear()
+        self._conn.execute("DELETE FROM entries")
+        self._conn.commit()
+        self._conn.execute("VACUUM")
+
+    def export(self, target):
+        """Copy the cache to a file, to restore it elsewhere with merge.
+
+        :param target: The file to write
+        """
+        self.flush()
+        with sqlite3.connect(target) as conn:
+            self._conn.backup(conn)
+        conn.close()
+
+    def merge(self, source):
+        """Add the values of an exported cache, keeping the most recently used of each.
+
+        :param source: The exported cache file
+        :return: The number of values added or replaced
+        """
+        self.flush()
+        self._conn.execute("ATTACH DATABASE ? AS source", (os.fspath(source),))
+        try:
+            merged = self._conn.execute(
+                "INSERT INTO entries SELECT * FROM source.entries WHERE true"
+                " ON CONFLICT (kind, key) DO UPDATE SET value = excluded.value,"
+                " size = excluded.size, used = excluded.used WHERE excluded.used > entries.used"
+            ).rowcount
+            self._conn.commit()
+        finally:
+            self._conn.execute("DETACH DATABASE source")
+        return merged
+
+    def close(self):
+        """Write the pending values, prune and close the database."""
+        try:
+            self.prune()
+        finally:
+            self._conn.close()
+
+    @staticmethod
+    def add_arguments(parser):
+        """Add the --no-cache option to a command.
+
+        :param parser: The argument parser of the command
+        """
+        parser.add_argument(
+            "--no-cache",
+            dest="no_cache",
+            action="store_true",
+            help="Don't read or write the collection_prep cache in the user cache directory",
+        )
+
+    @classmethod
+    @contextmanager
+    def from_args(cls, args):
+        """Open the cache for a command, unless it was disabled on the command line.
+
+        A cache that can't be opened is logged and the command runs without it.
+
+        :param args: The parsed command line, with the no_cache option
+        :yield: The cache, or None
+        """
+        store = None
+        if not args.no_cache:
+            try:
+                store = cls()
+            except (OSError, sqlite3.Error) as exc:
+                logging.warning("Not using the cache: %s", exc)
+        try:
+            yield store
+        finally:
+            if store is not None:
+                store.close()
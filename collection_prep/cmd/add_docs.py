@@ -2,35 +2,44 @@
 # PYTHON_ARGCOMPLETE_OK
 
 """Generate or update collection documentation."""
+# ansible-core, jinja2 and yaml are imported where they are used, so --help,
+# argcomplete and runs with nothing to regenerate don't pay for them
+# pylint: disable-msg=import-outside-toplevel
 import ast
+import copy
+import json
 import logging
 import os
 import re
-import shutil
 import sys
-import tempfile
 
 from argparse import ArgumentParser
+from collections import Counter
+from functools import cache
 from functools import partial
 from pathlib import Path
-from typing import Optional
 
-import yaml
-
-from ansible.module_utils._text import to_text
-from ansible.module_utils.common.collections import is_sequence
-from ansible.module_utils.six import string_types
-from ansible.plugins.loader import fragment_loader
-from ansible.utils import plugin_docs
-from ansible.utils.collection_loader._collection_finder import _AnsibleCollectionFinder
-from jinja2 import Environment
-from jinja2 import FileSystemLoader
-
-from collection_prep.jinja_utils import documented_type
-from collection_prep.jinja_utils import from_kludge_ns
-from collection_prep.jinja_utils import html_ify
-from collection_prep.jinja_utils import rst_ify
-from collection_prep.jinja_utils import to_kludge_ns
+from collection_prep import lite_extractor
+from collection_prep import timing
+from collection_prep.cache import Cache
+from collection_prep.collection_model import CollectionModel
+from collection_prep.docs_batch import add_collection
+from collection_prep.docs_batch import find_collections
+from collection_prep.docs_batch import generate_all
+from collection_prep.docs_batch import link_collection
+from collection_prep.docs_batch import load_galaxy
+from collection_prep.docs_batch import run_plugins
+from collection_prep.docs_manifest import affected_plugins
+from collection_prep.docs_manifest import changed_plugins
+from collection_prep.docs_manifest import docs_key
+from collection_prep.docs_manifest import load_manifest
+from collection_prep.docs_manifest import manifest_inputs
+from collection_prep.docs_manifest import plan_plugins
+from collection_prep.docs_manifest import read_cached
+from collection_prep.docs_manifest import save_manifest
+from collection_prep.fragment_resolver import FragmentRecorder
+from collection_prep.fragment_resolver import FragmentResolver
+from collection_prep.utils import write_if_changed
 
 
 try:
@@ -42,21 +51,10 @@ except ImportError:
 logging.basicConfig(format="%(levelname)-10s%(message)s", level=logging.INFO)
 
 
-IGNORE_FILES = ["__init__.py"]
-SUBDIRS = (
-    "become",
-    "cliconf",
-    "connection",
-    "filter",
-    "httpapi",
-    "inventory",
-    "lookup",
-    "netconf",
-    "modules",
-    "test",
-    "validate",
-)
 TEMPLATE_DIR = os.path.dirname(__file__)
+# How plugin documentation is read and doc fragments merged: with ansible-core's
+# plugin_docs, or with collection_prep.lite_extractor, which doesn't import ansible-core
+ENGINES = ("ansible", "lite")
 ANSIBLE_COMPAT = """## Ansible version compatibility
 
 This collection has been tested against the following Ansible versions: **{requires_ansible}**.
@@ -95,11 +93,22 @@ def convert_descriptions(data):
                 convert_descriptions(definition["contains"])
 
 
+@cache
 def jinja_environment():
     """Define the jinja environment.
 
+    The template is built once per process and reused for every plugin.
+
     :return: A jinja template, with the env set
     """
+    from ansible.module_utils.common.collections import is_sequence
+    from jinja2 import Environment
+    from jinja2 import FileSystemLoader
+
+    from collection_prep.jinja_utils import documented_type
+    from collection_prep.jinja_utils import html_ify
+    from collection_prep.jinja_utils import rst_ify
+
     env = Environment(
         loader=FileSystemLoader(TEMPLATE_DIR),
         variable_start_string="@{",
@@ -111,23 +120,20 @@ def jinja_environment():
     env.filters["documented_type"] = documented_type
     env.tests["list"] = partial(is_sequence, include_strings=False)
     env.filters["html_ify"] = html_ify
-    env.globals["to_kludge_ns"] = to_kludge_ns
-    env.globals["from_kludge_ns"] = from_kludge_ns
     template = env.get_template("plugin.rst.j2")
     return template
 
 
-def update_readme(content, path, gh_url, branch_name):  # pylint: disable-msg=too-many-locals
-    """Update the README.md in the repository.
+def plugin_table(content, gh_url, branch_name):
+    """Build the README.md plugin tables.
 
     :param content: The dict containing the content
     :type content: dict
-    :param path: The path to the collection
-    :type path: str
     :param gh_url: The url to the GitHub repository
     :type gh_url: str
     :param branch_name: The name of the main repository branch
     :type branch_name: str
+    :return: The lines of the plugin tables
     """
     data = []
     gh_url = re.sub(r"\.git$", "", gh_url)
@@ -155,30 +161,73 @@ def update_readme(content, path, gh_url, branch_name):  # pylint: disable-msg=to
             description = info["comment"].replace("|", "\\|").strip()
             data.append(f"{link}|{description}")
         data.append("")
+    return data
+
+
+def replace_section(content, start_anchor, end_anchor, data):
+    """Replace the lines between two anchors.
+
+    :param content: The lines of the README.md
+    :type content: list
+    :param start_anchor: The line marking the start of the section
+    :type start_anchor: str
+    :param end_anchor: The line marking the end of the section
+    :type end_anchor: str
+    :param data: The new lines of the section
+    :type data: list
+    :return: The updated lines, or None if the anchors were not found
+    """
+    try:
+        start = content.index(start_anchor)
+        end = content.index(end_anchor)
+    except ValueError:
+        return None
+    if start and end:
+        return content[0 : start + 1] + data + content[end:]
+    return content
+
+
+def update_readme(content, runtime, path, gh_url, branch_name):
+    """Update the plugin tables and ansible compatibility in the README.md.
+
+    The README.md is read once, both sections are updated and it is only
+    written if the result differs.
+
+    :param content: The dict containing the content
+    :type content: dict
+    :param runtime: runtime.yml contents
+    :type runtime: dict
+    :param path: The path to the collection
+    :type path: str
+    :param gh_url: The url to the GitHub repository
+    :type gh_url: str
+    :param branch_name: The name of the main repository branch
+    :type branch_name: str
+    """
     readme = os.path.join(path, "README.md")
     try:
         with open(readme, encoding="utf8") as readme_file:
-            content = readme_file.read().splitlines()
+            lines = readme_file.read().splitlines()
     except FileNotFoundError:
         logging.error("README.md not found in %s", path)
         logging.error("README.md not updated")
         sys.exit(1)
-    try:
-        start = content.index("<!--start collection content-->")
-        end = content.index("<!--end collection content-->")
-    except ValueError:
+
+    data = plugin_table(content=content, gh_url=gh_url, branch_name=branch_name)
+    lines = replace_section(
+        lines, "<!--start collection content-->", "<!--end collection content-->", data
+    )
+    if lines is None:
         logging.error("Content anchors not found in %s", readme)
         logging.error("README.md not updated")
         sys.exit(1)
-    if start and end:
-        new = content[0 : start + 1] + data + content[end:]
-        with open(readme, "w", encoding="utf8") as readme_file:
-            readme_file.write("\n".join(new))
-            # Avoid "No newline at end of file.
-            # No, I don't know why it has to be two of them.
-            # Yes, it actually does have to be two of them.
-            readme_file.write("\n\n")
+
+    lines = add_ansible_compatibility(runtime=runtime, content=lines, readme=readme)
+
+    if write_if_changed(readme, "\n".join(lines) + "\n"):
         logging.info("README.md updated")
+    else:
+        logging.info("README.md unchanged")
 
 
 def handle_simple(collection, fullpath, kind):  # pylint: disable-msg=too-many-locals
@@ -272,118 +321,361 @@ def handle_simple(collection, fullpath, kind):  # pylint: disable-msg=too-many-l
     return plugins
 
 
-def process(collection: str, path: Path):  # pylint: disable-msg=too-many-locals,too-many-branches
+def read_docstring(fullpath, data=None, engine="ansible"):
+    """Read the documentation of a plugin file, before its doc fragments are added.
+
+    :param fullpath: The full path to the plugin file
+    :type fullpath: Path
+    :param data: The documentation already read from the plugin file, if any
+    :type data: dict
+    :param engine: The engine reading the documentation, one of ENGINES
+    :type engine: str
+    :return: The doc, examples, return docs and metadata of the plugin
+    """
+    if data is not None:
+        # The documentation is shared with the other stages, and is changed while rendering
+        return copy.deepcopy(data)
+    if engine == "lite":
+        return lite_extractor.read_docstring(os.fspath(fullpath))
+
+    from ansible.module_utils._text import to_text
+    from ansible.utils import plugin_docs
+
+    return plugin_docs.read_docstring(to_text(fullpath), verbose=False, ignore_errors=False)
+
+
+def extract_plugin(fullpath, data=None, engine="ansible", stats=None):
+    """Extract the documentation of a plugin with its doc fragments added.
+
+    :param fullpath: The full path to the plugin file
+    :type fullpath: Path
+    :param data: The documentation already read from the plugin file, if any
+    :type data: dict
+    :param engine: The engine reading the documentation, one of ENGINES
+    :type engine: str
+    :param stats: Counts the doc fragment cache hits and misses, if given
+    :type stats: Counter
+    :return: The documentation and the content hash of each doc fragment used
+    """
+    recorder = FragmentRecorder(FragmentResolver.installed(), stats)
+    # get_docstring without a collection name, split to time the fragment merge on its own
+    with timing.phase("extract"):
+        data = read_docstring(fullpath, data, engine)
+    if data.get("doc", False):
+        with timing.phase("fragments"):
+            if engine == "lite":
+                # Parsed doc fragments are only shared with the lite merge, which copies them.
+                # ansible-core's add_fragments parses each fragment itself, with the plugin's
+                # file name, and takes no parsed document, so it parses once per plugin
+                lite_extractor.add_fragments(
+                    data["doc"], os.fspath(fullpath), fragment_loader=recorder, load=recorder.load
+                )
+            else:
+                from ansible.utils.plugin_docs import add_fragments
+
+                add_fragments(data["doc"], os.fspath(fullpath), fragment_loader=recorder)
+    return data, recorder.fragments
+
+
+def cacheable(data, fragments):
+    """Serialize newly extracted documentation for the cache.
+
+    Only documentation that reads back from JSON unchanged is cached, so the cached
+    docs of a plugin render exactly like freshly extracted ones. Documentation with
+    dates, tuples or keys that aren't strings is extracted again on every run.
+
+    :param data: The documentation of the plugin
+    :type data: dict
+    :param fragments: The content hash of each doc fragment used
+    :type fragments: dict
+    :return: The documentation and its doc fragments as JSON, or None if it can't be cached
+    """
+    with timing.phase("normalize"):
+        try:
+            text = json.dumps({"data": data, "fragments": fragments})
+        except (TypeError, ValueError):
+            return None
+        if json.loads(text)["data"] != data:
+            return None
+    return text
+
+
+def process_plugin(
+    collection,
+    fullpath,
+    subdir,
+    data=None,
+    extracted=None,
+    engine="ansible",
+    stats=None,
+    to_cache=False,
+):  # pylint: disable-msg=too-many-locals,too-many-arguments,too-many-positional-arguments
+    """Extract the documentation for a single plugin and render it.
+
+    :param collection: The collection name
+    :type collection: str
+    :param fullpath: The full path to the plugin file
+    :type fullpath: Path
+    :param subdir: The plugin directory the file lives in
+    :type subdir: str
+    :param data: The documentation already read from the plugin file, if any
+    :type data: dict
+    :param extracted: The documentation with its doc fragments, from the cache, if any
+    :type extracted: dict
+    :param engine: The engine reading the documentation, one of ENGINES
+    :type engine: str
+    :param stats: Counts the doc fragment cache hits and misses, if given
+    :type stats: Counter
+    :param to_cache: Serialize newly extracted documentation for the cache
+    :type to_cache: bool
+    :return: The manifest entry for the plugin, the rendered rst and the newly extracted
+        documentation as JSON, if it is to be cached
+    """
+    if subdir == "modules":
+        plugin_type = "module"
+    else:
+        plugin_type = subdir
+
+    import yaml
+
+    from ansible.module_utils.six import string_types
+
+    from collection_prep.jinja_utils import KludgeNamespace
+
+    logging.info("Processing %s", fullpath)
+    fresh = None
+    if extracted is None:
+        data, fragments = extract_plugin(fullpath, data, engine, stats)
+        fresh = cacheable(data, fragments) if to_cache else None
+    else:
+        data, fragments = extracted["data"], extracted["fragments"]
+    doc, examples, return_docs, metadata = (
+        data["doc"],
+        data["plainexamples"],
+        data["returndocs"],
+        data["metadata"],
+    )
+    entry = {"key": subdir, "plugins": {}, "rst": None, "fragments": fragments}
+    if doc is None and subdir in ["filter", "test"]:
+        name_only = fullpath.name.rsplit(".")[0]
+        entry["key"] = f"{name_only} {subdir}"
+        with timing.phase("simple"):
+            entry["plugins"] = handle_simple(collection, fullpath, subdir)
+        return entry, None, fresh
+    if not doc:
+        return entry, None, fresh
+
+    doc["plugin_type"] = plugin_type
+
+    if return_docs:
+        # Seems a recent change in devel makes this
+        # return a dict not a yaml string.
+        if isinstance(return_docs, dict):
+            doc["return_docs"] = return_docs
+        else:
+            with timing.phase("yaml"):
+                doc["return_docs"] = yaml.safe_load(return_docs)
+        convert_descriptions(doc["return_docs"])
+
+    doc["metadata"] = (metadata,)
+    if isinstance(examples, string_types):
+        doc["plain_examples"] = examples.strip()
+    else:
+        doc["examples"] = examples
+
+    doc["module"] = f"{collection}." "{plugin_name}".format(
+        plugin_name=doc.get(plugin_type, doc.get("name"))
+    )
+    doc["author"] = ensure_list(doc["author"])
+    doc["description"] = ensure_list(doc["description"])
+    try:
+        convert_descriptions(doc["options"])
+    except KeyError:
+        pass  # This module takes no options
+
+    entry["rst"] = doc["module"] + f"_{plugin_type}" + ".rst"
+    entry["plugins"] = {doc["module"]: {"has_rst": True, "comment": doc["short_description"]}}
+    with timing.phase("render"):
+        return entry, jinja_environment().render(doc, kludge_ns=KludgeNamespace()), fresh
+
+
+def timed_process_plugin(
+    collection, fullpath, subdir, data=None, extracted=None, engine="ansible", to_cache=False
+):  # pylint: disable-msg=too-many-arguments,too-many-positional-arguments
+    """Run process_plugin, collecting the timings of its phases.
+
+    :param collection: The collection name
+    :type collection: str
+    :param fullpath: The full path to the plugin file
+    :type fullpath: Path
+    :param subdir: The plugin directory the file lives in
+    :type subdir: str
+    :param data: The documentation already read from the plugin file, if any
+    :type data: dict
+    :param extracted: The documentation with its doc fragments, from the cache, if any
+    :type extracted: dict
+    :param engine: The engine reading the documentation, one of ENGINES
+    :type engine: str
+    :param to_cache: Serialize newly extracted documentation for the cache
+    :type to_cache: bool
+    :return: The result of process_plugin, its timing records and its doc fragment cache
+        hits and misses
+    """
+    stats = Counter()
+    with timing.capture(f"plugins/{subdir}/{fullpath.name}") as records:
+        result = process_plugin(
+            collection, fullpath, subdir, data, extracted, engine, stats, to_cache
+        )
+    return result, records, stats
+
+
+def log_fragment_stats(stats):
+    """Log the hit rates of the doc fragment cache.
+
+    :param stats: The doc fragment cache hits and misses of every plugin
+    :type stats: Counter
+    """
+    rates = []
+    for kind in ("load", "parse"):
+        hits, total = stats[f"{kind} hits"], stats[f"{kind} hits"] + stats[f"{kind} misses"]
+        if total:
+            rates.append(f"{kind}s {hits}/{total} ({hits / total:.0%})")
+    if rates:
+        logging.info("Doc fragment cache hits: %s", ", ".join(rates))
+
+
+def read_documentation(tasks, model):
+    """Read the documentation of each plugin to process from the shared model.
+
+    :param tasks: The arguments to process_plugin for each plugin
+    :type tasks: list
+    :param model: The plugin files of the collection shared with the other stages
+    :type model: CollectionModel
+    :return: The tasks, with the documentation of each plugin
+    """
+    read = []
+    for collection, fullpath, subdir, data, extracted in tasks:
+        if data is None and extracted is None:
+            with timing.phase("extract", f"plugins/{subdir}/{fullpath.name}"):
+                data = model.docstring(fullpath)
+        read.append((collection, fullpath, subdir, data, extracted))
+    return read
+
+
+def process(
+    collection: str,
+    path: Path,
+    jobs: int = 1,
+    pool: str = "process",
+    changed: list = None,
+    model: CollectionModel = None,
+    store: Cache = None,
+    executor=None,
+    engine: str = "ansible",
+):  # pylint: disable-msg=too-many-locals,too-many-arguments,too-many-positional-arguments
     """Process the files in each subdirectory.
 
+    Plugins whose source, doc fragments, template and ansible-core version match
+    the manifest from the previous run are not extracted or rendered again.
+    When the changed files are given, only those plugins and the plugins extending
+    a changed doc fragment are checked, the rest are taken from the manifest.
+
     :param collection: The collection name
     :type collection: str
     :param path: The path to the collection
     :type path: Path
+    :param jobs: The number of workers used to extract and render plugins
+    :type jobs: int
+    :param pool: The kind of worker pool, process or thread
+    :type pool: str
+    :param changed: The files changed since the previous run, or None to check every plugin
+    :type changed: list
+    :param model: The plugin files of the collection shared with the other stages, if any
+    :type model: CollectionModel
+    :param store: The cache shared with the other commands and runs, if enabled
+    :type store: Cache
+    :param executor: A worker pool shared with other collections, if any
+    :type executor: Executor
+    :param engine: The engine reading the documentation, one of ENGINES
+    :type engine: str
     :return: A mapping of plugins to plugin types
     """
-    template = jinja_environment()
     docs_path = Path(path, "docs")
-    if docs_path.is_dir():
-        logging.info("Purging existing rst files from directory %s", docs_path)
-        for entry in docs_path.glob("*.rst"):
-            entry.unlink()
+    inputs = manifest_inputs(collection, engine)
+    previous = load_manifest(docs_path, inputs)
+    affected = None
+    if previous is not None:
+        if changed is not None:
+            affected = changed_plugins(collection, path, previous["fragments"], changed)
+            logging.info("Changed files affect %s plugins", len(affected))
+        previous = previous["plugins"]
+        existing = {entry["rst"] for entry in previous.values()}
+    else:
+        # Without a manifest every rst file is assumed to be generated
+        previous = {}
+        existing = {entry.name for entry in docs_path.glob("*.rst")}
     logging.info("Making docs directory %s", docs_path)
     Path(docs_path).mkdir(parents=True, exist_ok=True)
 
-    content = {}
+    with timing.phase("plan"):
+        listing, entries, tasks, sources = plan_plugins(collection, path, previous, affected, model)
+    if store is not None and tasks:
+        tasks = read_cached(tasks, sources, store, inputs)
+    if model is not None and jobs <= 1 and engine == "ansible":
+        tasks = read_documentation(tasks, model)
+
+    logging.info("Regenerating docs for %s of %s plugins", len(tasks), len(entries) + len(tasks))
+    written = 0
+    stats = Counter()
+    run = partial(timed_process_plugin, engine=engine, to_cache=store is not None)
+    for (relpath, source), (entry, rst, extracted) in zip(
+        sources, run_plugins(run, tasks, jobs, pool, executor, stats)
+    ):
+        entry["source"] = source
+        entries[relpath] = entry
+        if store is not None and extracted is not None:
+            store.put("docs", docs_key(source, inputs), json.loads(extracted))
+        if entry["rst"] is not None:
+            with timing.phase("write", relpath):
+                written += write_if_changed(Path(docs_path, entry["rst"]), rst)
+
+    # Only remove the rst files of plugins that no longer produce them
+    stale = existing - {entry["rst"] for entry in entries.values()}
+    for rst_name in sorted(filter(None, stale)):
+        logging.info("Removing %s", rst_name)
+        Path(docs_path, rst_name).unlink(missing_ok=True)
+
+    produced = sum(1 for entry in entries.values() if entry["rst"])
+    logging.info(
+        "Wrote %s rst files, %s unchanged, %s removed",
+        written,
+        produced - written,
+        len(stale - {None}),
+    )
+    log_fragment_stats(stats)
 
-    for subdir in SUBDIRS:  # pylint: disable-msg=too-many-nested-blocks
-        if subdir == "modules":
-            plugin_type = "module"
-        else:
-            plugin_type = subdir
-
-        dirpath = Path(path, "plugins", subdir)
-        if dirpath.is_dir():
-            content[subdir] = {}
-            logging.info("Process content in %s", dirpath)
-            for filename in os.listdir(dirpath):
-                if filename.endswith(".py") and filename not in IGNORE_FILES:
-                    fullpath = Path(dirpath, filename)
-                    logging.info("Processing %s", fullpath)
-                    (
-                        doc,
-                        examples,
-                        return_docs,
-                        metadata,
-                    ) = plugin_docs.get_docstring(to_text(fullpath), fragment_loader)
-                    if doc is None and subdir in ["filter", "test"]:
-                        name_only = filename.rsplit(".")[0]
-                        combined_ptype = f"{name_only} {subdir}"
-                        content[combined_ptype] = handle_simple(collection, fullpath, subdir)
-                    else:
-                        if doc:
-                            doc["plugin_type"] = plugin_type
-
-                            if return_docs:
-                                # Seems a recent change in devel makes this
-                                # return a dict not a yaml string.
-                                if isinstance(return_docs, dict):
-                                    doc["return_docs"] = return_docs
-                                else:
-                                    doc["return_docs"] = yaml.safe_load(return_docs)
-                                convert_descriptions(doc["return_docs"])
-
-                            doc["metadata"] = (metadata,)
-                            if isinstance(examples, string_types):
-                                doc["plain_examples"] = examples.strip()
-                            else:
-                                doc["examples"] = examples
-
-                            doc["module"] = f"{collection}." "{plugin_name}".format(
-                                plugin_name=doc.get(plugin_type, doc.get("name"))
-                            )
-                            doc["author"] = ensure_list(doc["author"])
-                            doc["description"] = ensure_list(doc["description"])
-                            try:
-                                convert_descriptions(doc["options"])
-                            except KeyError:
-                                pass  # This module takes no options
-
-                            module_rst_path = Path(
-                                path,
-                                "docs",
-                                doc["module"] + f"_{plugin_type}" + ".rst",
-                            )
-
-                            with open(module_rst_path, "w", encoding="utf8") as doc_file:
-                                doc_file.write(template.render(doc))
-                            content[subdir][doc["module"]] = {
-                                "has_rst": True,
-                                "comment": doc["short_description"],
-                            }
+    # Assemble in listing order, so the content matches a full serial run
+    content = {}
+    ordered = {}
+    for subdir, relpaths in listing.items():
+        content[subdir] = {}
+        for relpath in relpaths:
+            ordered[relpath] = entries[relpath]
+            content.setdefault(ordered[relpath]["key"], {}).update(ordered[relpath]["plugins"])
+
+    with timing.phase("manifest"):
+        save_manifest(docs_path, inputs, ordered)
     return content
 
 
-def load_galaxy(path):
-    """Load collection details from the galaxy.yml file in the collection.
-
-    :param path: The path the collection
-    :return: The collection name and gh url
-    """
-    try:
-        with open(Path(path, "galaxy.yml"), encoding="utf8") as stream:
-            try:
-                return yaml.safe_load(stream)
-            except yaml.YAMLError:
-                logging.error("Unable to parse galaxy.yml in %s", path)
-                sys.exit(1)
-    except FileNotFoundError:
-        logging.error("Unable to find galaxy.yml in %s", path)
-        sys.exit(1)
-
-
 def load_runtime(path):
     """Load runtime details from the runtime.yml file in the collection.
 
     :param path: The path the collection
     :return: The runtime dict
     """
+    import yaml
+
     try:
         with open(Path(path, "meta/runtime.yml"), encoding="utf8") as stream:
             try:
@@ -396,123 +688,176 @@ def load_runtime(path):
         sys.exit(1)
 
 
-def link_collection(path: Path, galaxy: dict, collection_root: Optional[Path] = None):
-    """Link the provided collection into the Ansible default collection path.
+def add_ansible_compatibility(runtime, content, readme):
+    """Add ansible compatibility information to the README.md lines.
 
-    :param path: A path
-    :type path: Path
-    :param galaxy: The galaxy.yml contents
-    :type galaxy: dict
-    :param collection_root: The root collections path
+    :param runtime: runtime.yml contents
+    :type runtime: dict
+    :param content: The lines of the README.md
+    :type content: list
+    :param readme: The path to the README.md
+    :type readme: str
+    :return: The updated lines
     """
-    if collection_root is None:
-        collection_root = Path(Path.home(), ".ansible/collections/ansible_collections")
-
-    namespace_directory = Path(collection_root, galaxy["namespace"])
-    collection_directory = Path(namespace_directory, galaxy["name"])
-
-    logging.info("Linking collection to collection path %s", collection_root)
-    logging.info("This is required for the Ansible fragment loader to find doc fragments")
-
-    if collection_directory.exists():
-        logging.info("Attempting to remove existing %s", collection_directory)
-
-        if collection_directory.is_symlink():
-            logging.info("Unlinking: %s", collection_directory)
-            collection_directory.unlink()
-        else:
-            logging.info("Deleting: %s", collection_directory)
-            shutil.rmtree(collection_directory)
-
-    logging.info("Creating namespace directory %s", namespace_directory)
-    namespace_directory.mkdir(parents=True, exist_ok=True)
-
-    logging.info("Linking collection %s -> %s", path, collection_directory)
-    collection_directory.symlink_to(path)
-
-
-def add_collection(path: Path, galaxy: dict) -> Optional[tempfile.TemporaryDirectory]:
-    """Add path to collections dir so we can find local doc_fragments.
+    requires_ansible = runtime.get("requires_ansible")
+    if not requires_ansible:
+        logging.error("Unable to find requires_ansible in runtime.yml, not added to README")
+        return content
+    data = ANSIBLE_COMPAT.format(requires_ansible=requires_ansible).splitlines()
+    new = replace_section(
+        content, "<!--start requires_ansible-->", "<!--end requires_ansible-->", data
+    )
+    if new is None:
+        logging.error("requires_ansible anchors not found in %s", readme)
+        logging.error("README.md not updated with ansible compatibility information")
+        sys.exit(1)
+    logging.info("Added ansible compatibility information")
+    return new
+
+
+def generate(
+    path,
+    galaxy,
+    branch_name="main",
+    jobs=1,
+    pool="process",
+    changed=None,
+    link=False,
+    model=None,
+    store=None,
+    engine="ansible",
+):  # pylint: disable-msg=too-many-arguments,too-many-positional-arguments
+    """Generate the plugin docs of a collection and update its README.md.
 
-    :param path: The collections path
+    :param path: The path to the collection
+    :type path: str
     :param galaxy: The contents of galaxy.yml
-    :return: A temporary alternate directory if the collection is not in a valid location
+    :type galaxy: dict
+    :param branch_name: The name of the main repository branch
+    :type branch_name: str
+    :param jobs: The number of workers used to extract and render plugins
+    :type jobs: int
+    :param pool: The kind of worker pool, process or thread
+    :type pool: str
+    :param changed: The files changed since the previous run, or None to check every plugin
+    :type changed: list
+    :param link: Link the collection in ~/.ansible/collections
+    :type link: bool
+    :param model: The plugin files of the collection shared with the other stages, if any
+    :type model: CollectionModel
+    :param store: The cache shared with the other commands and runs, if enabled
+    :type store: Cache
+    :param engine: The engine reading the documentation, one of ENGINES
+    :type engine: str
     """
-    collections_path = None
-    tempdir = None
-
-    try:
-        collections_path = path.parents[1]
-    except IndexError:
-        pass
-
-    # Check that parent dir is named ansible_collections
-    if collections_path and collections_path.name != "ansible_collections":
-        logging.info("%s doesn't look enough like a collection", collections_path)
-        collections_path = None
-
-    if collections_path is None:
-        tempdir = tempfile.TemporaryDirectory()  # pylint: disable-msg=consider-using-with
-        logging.info("Temporary collection path %s created", tempdir.name)
-        collections_path = Path(tempdir.name) / "ansible_collections"
-        link_collection(path, galaxy, collection_root=collections_path)
+    collection = f"{galaxy['namespace']}.{galaxy['name']}"
+    collection_path = Path(path).absolute()
+    with timing.phase("link"):
+        if link:
+            link_collection(collection_path, galaxy)
+        add_collection(collection_path, galaxy)
+    content = process(
+        collection=collection,
+        path=collection_path,
+        jobs=jobs,
+        pool=pool,
+        changed=changed,
+        model=model,
+        store=store,
+        engine=engine,
+    )
+    write_readme(path, galaxy, content, branch_name)
 
-    full_path = collections_path / galaxy["namespace"] / galaxy["name"]
-    logging.info("Collection path is %s", full_path)
 
-    # Tell ansible about the path
-    _AnsibleCollectionFinder(  # pylint: disable-msg=protected-access
-        paths=[collections_path, "~/.ansible/collections"]
-    )._install()
+def write_readme(path, galaxy, content, branch_name="main"):
+    """Update the README.md of a collection with its plugins and ansible compatibility.
 
-    # This object has to outlive this method or it will be cleaned up before
-    # we can use it
-    return tempdir
+    :param path: The path to the collection
+    :type path: str
+    :param galaxy: The contents of galaxy.yml
+    :type galaxy: dict
+    :param content: A mapping of plugins to plugin types
+    :type content: dict
+    :param branch_name: The name of the main repository branch
+    :type branch_name: str
+    """
+    runtime = load_runtime(path=Path(path).absolute())
+    with timing.phase("readme"):
+        update_readme(
+            content=content,
+            runtime=runtime,
+            path=path,
+            gh_url=galaxy["repository"],
+            branch_name=branch_name,
+        )
 
 
-def add_ansible_compatibility(runtime, path):
-    """Add ansible compatibility information to README.
+def document_collection(
+    collection,
+    path,
+    galaxy,
+    executor=None,
+    branch_name="main",
+    jobs=1,
+    pool="process",
+    store=None,
+    engine="ansible",
+):  # pylint: disable-msg=too-many-arguments,too-many-positional-arguments
+    """Generate the plugin docs of a collection of a batch and update its README.md.
 
-    :param runtime: runtime.yml contents
-    :type runtime: dict
-    :param path: A path
-    :type path: str
+    :param collection: The collection name
+    :type collection: str
+    :param path: The path to the collection
+    :type path: Path
+    :param galaxy: The contents of galaxy.yml
+    :type galaxy: dict
+    :param executor: The worker pool shared by the batch, if any
+    :type executor: Executor
+    :param branch_name: The name of the main repository branch
+    :type branch_name: str
+    :param jobs: The number of workers used to extract and render plugins
+    :type jobs: int
+    :param pool: The kind of worker pool, process or thread
+    :type pool: str
+    :param store: The cache shared with the other commands and runs, if enabled
+    :type store: Cache
+    :param engine: The engine reading the documentation, one of ENGINES
+    :type engine: str
+    :return: A mapping of plugins to plugin types
     """
-    requires_ansible = runtime.get("requires_ansible")
-    if not requires_ansible:
-        logging.error("Unable to find requires_ansible in runtime.yml, not added to README")
-        return
-    readme = os.path.join(path, "README.md")
-    try:
-        with open(readme, encoding="utf8") as readme_file:
-            content = readme_file.read().splitlines()
-    except FileNotFoundError:
-        logging.error("README.md not found in %s", path)
-        logging.error("README.md not updated")
-        sys.exit(1)
-    try:
-        start = content.index("<!--start requires_ansible-->")
-        end = content.index("<!--end requires_ansible-->")
-    except ValueError:
-        logging.error("requires_ansible anchors not found in %s", readme)
-        logging.error("README.md not updated with ansible compatibility information")
-        sys.exit(1)
-    if start and end:
-        data = ANSIBLE_COMPAT.format(requires_ansible=requires_ansible).splitlines()
-        new = content[0 : start + 1] + data + content[end:]
-        with open(readme, "w", encoding="utf8") as readme_file:
-            readme_file.write("\n".join(new))
-        logging.info("README.md updated with ansible compatibility information")
+    content = process(
+        collection=collection,
+        path=path,
+        jobs=jobs,
+        pool=pool,
+        store=store,
+        executor=executor,
+        engine=engine,
+    )
+    write_readme(path, galaxy, content, branch_name)
+    return content
 
 
 def main():
     """Run the script."""
     parser = ArgumentParser()
-    parser.add_argument(
+    location = parser.add_mutually_exclusive_group(required=True)
+    location.add_argument(
         "-p",
         "--path",
-        help="The path to the collection (ie ./ansible.netcommon",
-        required=True,
+        action="append",
+        help="The path to the collection (ie ./ansible.netcommon), repeat to document several",
+    )
+    location.add_argument(
+        "--collections-tree",
+        dest="collections_tree",
+        metavar="PATH",
+        help="Document every collection with a galaxy.yml in this ansible_collections tree",
+    )
+    parser.add_argument(
+        "files",
+        nargs="*",
+        help="Only regenerate the docs affected by these changed files, as passed by pre-commit",
     )
     parser.add_argument(
         "-b",
@@ -521,41 +866,95 @@ def main():
         default="main",
         help="The name of the main branch of the collection",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="The number of workers used to extract and render plugin docs",
+    )
+    parser.add_argument(
+        "--pool",
+        choices=["process", "thread"],
+        default="process",
+        help="Run the workers as processes or as threads in this process",
+    )
+    parser.add_argument(
+        "--affected-by",
+        dest="affected_by",
+        nargs="+",
+        metavar="FILE",
+        help="List the plugins to regenerate for these changed files, then exit",
+    )
     parser.add_argument(
         "--link-collection",
         dest="link_collection",
         action="store_true",
         help="Link the collection in ~/.ansible/collections",
     )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="ansible",
+        help="Read plugin docs with ansible-core, or with the lighter collection_prep reader",
+    )
+    timing.add_arguments(parser)
+    Cache.add_arguments(parser)
 
     if argcomplete:
         argcomplete.autocomplete(parser)
 
     args = parser.parse_args()
-    path = Path(args.path).absolute()
-    galaxy = load_galaxy(path=path)
-    collection = f"{galaxy['namespace']}.{galaxy['name']}"
-    logging.info("Setting collection name to %s", collection)
-    gh_url = galaxy["repository"]
-    logging.info("Setting GitHub repository url to %s", gh_url)
-
-    tempdir = None
-    if args.link_collection:
-        link_collection(path, galaxy)
-    else:
-        tempdir = add_collection(path, galaxy)
-    content = process(collection=collection, path=path)
-    if tempdir is not None:
-        tempdir.cleanup()
-
-    update_readme(
-        content=content,
-        path=args.path,
-        gh_url=gh_url,
-        branch_name=args.branch_name,
-    )
-    runtime = load_runtime(path=path)
-    add_ansible_compatibility(runtime=runtime, path=args.path)
+    paths = args.path or find_collections(args.collections_tree)
+    if args.collections_tree or len(paths) > 1:
+        if args.files or args.affected_by:
+            parser.error("changed files can only be given for a single collection")
+        if not paths:
+            parser.error(f"no collections found in {args.collections_tree}")
+        with timing.instrument(args, "add_docs"), Cache.from_args(args) as store:
+            document = partial(
+                document_collection,
+                branch_name=args.branch_name,
+                jobs=args.jobs,
+                pool=args.pool,
+                store=store,
+                engine=args.engine,
+            )
+            failed = generate_all(
+                paths=paths,
+                document=document,
+                jobs=args.jobs,
+                pool=args.pool,
+                link=args.link_collection,
+            )
+        sys.exit(int(bool(failed)))
+
+    with timing.instrument(args, "add_docs"), Cache.from_args(args) as store:
+        path = Path(paths[0]).absolute()
+        galaxy = load_galaxy(path=path)
+        collection = f"{galaxy['namespace']}.{galaxy['name']}"
+        logging.info("Setting collection name to %s", collection)
+        gh_url = galaxy["repository"]
+        logging.info("Setting GitHub repository url to %s", gh_url)
+
+        if args.affected_by:
+            for relpath in sorted(
+                affected_plugins(collection, path, args.affected_by, args.engine)
+            ):
+                print(relpath)
+            return
+
+        generate(
+            path=paths[0],
+            galaxy=galaxy,
+            branch_name=args.branch_name,
+            jobs=args.jobs,
+            pool=args.pool,
+            changed=args.files or None,
+            link=args.link_collection,
+            store=store,
+            engine=args.engine,
+        )
 
 
 if __name__ == "__main__":
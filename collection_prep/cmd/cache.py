@@ -0,0 +1,87 @@
+"""Inspect, prune, export and import the collection_prep cache."""
+import logging
+import sqlite3
+import sys
+
+from argparse import ArgumentParser
+
+from collection_prep.cache import DEFAULT_MAX_AGE_DAYS
+from collection_prep.cache import DEFAULT_MAX_SIZE_MB
+from collection_prep.cache import Cache
+
+
+try:
+    import argcomplete
+except ImportError:
+    argcomplete = None
+
+
+logging.basicConfig(format="%(levelname)-10s%(message)s", level=logging.INFO)
+
+
+def main():
+    """Run the script."""
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--cache-file",
+        dest="cache_file",
+        help="The cache database, collection_prep/cache.sqlite3 in the user cache by default",
+    )
+    actions = parser.add_subparsers(dest="action", required=True)
+    actions.add_parser("info", help="Show where the cache is and what it holds")
+    prune = actions.add_parser("prune", help="Remove the values not used recently")
+    prune.add_argument(
+        "--max-age",
+        dest="max_age",
+        type=float,
+        default=DEFAULT_MAX_AGE_DAYS,
+        help="Remove the values not used for this many days",
+    )
+    prune.add_argument(
+        "--max-size",
+        dest="max_size",
+        type=float,
+        default=DEFAULT_MAX_SIZE_MB,
+        help="Then remove the least recently used values over this many megabytes",
+    )
+    export = actions.add_parser("export", help="Copy the cache to a file")
+    export.add_argument("file", help="The file to write")
+    restore = actions.add_parser("import", help="Add the values of an exported cache")
+    restore.add_argument("file", help="The exported cache")
+    actions.add_parser("clear", help="Remove every value")
+
+    if argcomplete:
+        argcomplete.autocomplete(parser)
+
+    args = parser.parse_args()
+    store = Cache(args.cache_file)
+    try:
+        if args.action == "info":
+            print(f"Cache: {store.path}")
+            stats = store.stats()
+            for kind, totals in stats.items():
+                print(f"{kind:>12} {totals['count']:>8} values {totals['size'] / 1024:>10.1f} KiB")
+            if not stats:
+                print("The cache is empty")
+        elif args.action == "prune":
+            removed = store.prune(max_age_days=args.max_age, max_size_mb=args.max_size)
+            logging.info("Removed %s values", removed)
+        elif args.action == "export":
+            store.export(args.file)
+            logging.info("Exported %s to %s", store.path, args.file)
+        elif args.action == "import":
+            try:
+                merged = store.merge(args.file)
+            except sqlite3.Error as exc:
+                logging.error("Unable to import %s: %s", args.file, exc)
+                sys.exit(1)
+            logging.info("Imported %s values from %s", merged, args.file)
+        elif args.action == "clear":
+            store.clear()
+            logging.info("Cleared %s", store.path)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
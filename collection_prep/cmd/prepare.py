@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# PYTHON_ARGCOMPLETE_OK
+
+"""Run the update, runtime, docs and version commands in a single process."""
+import logging
+import sys
+
+from argparse import ArgumentParser
+from pathlib import Path
+
+from collection_prep import timing
+from collection_prep.cache import Cache
+from collection_prep.cmd import add_docs
+from collection_prep.cmd import runtime
+from collection_prep.cmd import update
+from collection_prep.cmd import version
+from collection_prep.collection_model import CollectionModel
+
+
+try:
+    import argcomplete
+except ImportError:
+    argcomplete = None
+
+
+logging.basicConfig(format="%(levelname)-10s%(message)s", level=logging.INFO)
+
+
+# The stages in the order they run, each one reads what the previous ones wrote
+STAGES = ("update", "runtime", "docs", "version")
+
+
+def run_stages(
+    path,
+    stages,
+    jobs=1,
+    pool="process",
+    branch_name="main",
+    link=False,
+    store=None,
+    engine="ansible",
+):  # pylint: disable-msg=too-many-arguments,too-many-positional-arguments
+    """Run stages against one collection, sharing the plugin files read and parsed.
+
+    :param path: The path to the collection
+    :param stages: The stages to run, they run in the order of STAGES
+    :param jobs: The number of workers used to update plugin files and render docs
+    :param pool: The kind of worker pool used to render docs, process or thread
+    :param branch_name: The name of the main branch of the collection
+    :param link: Link the collection in ~/.ansible/collections
+    :param store: The cache shared by the stages and with other runs, if enabled
+    :param engine: The engine reading plugin docs, one of add_docs.ENGINES
+    :return: The plugin files that failed to update
+    """
+    collection_path = Path(path).absolute()
+    galaxy = add_docs.load_galaxy(path=collection_path)
+    collection = f"{galaxy['namespace']}.{galaxy['name']}"
+    logging.info("Setting collection name to %s", collection)
+    model = CollectionModel(collection, collection_path)
+
+    failed = []
+    if "update" in stages:
+        with timing.phase("update"):
+            failed, _changed = update.process(
+                collection=collection,
+                path=f"{collection_path.parent}/",
+                jobs=jobs,
+                model=model,
+                store=store,
+            )
+    if "runtime" in stages:
+        with timing.phase("runtime"):
+            runtime.process(
+                collection=collection, path=str(collection_path.parent), model=model, store=store
+            )
+    if "docs" in stages:
+        with timing.phase("docs"):
+            add_docs.generate(
+                path=path,
+                galaxy=galaxy,
+                branch_name=branch_name,
+                jobs=jobs,
+                pool=pool,
+                link=link,
+                model=model,
+                store=store,
+                engine=engine,
+            )
+    if "version" in stages:
+        with timing.phase("version"):
+            version.process(collection_path)
+    return failed
+
+
+def main():
+    """Run the script."""
+    parser = ArgumentParser()
+    parser.add_argument(
+        "-p",
+        "--path",
+        help="The path to the collection (ie ./ansible.netcommon)",
+        required=True,
+    )
+    parser.add_argument(
+        "-s",
+        "--stages",
+        nargs="+",
+        choices=STAGES,
+        default=list(STAGES),
+        help="The stages to run, they always run in the order update, runtime, docs, version",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="The number of workers used to update plugin files and render plugin docs",
+    )
+    parser.add_argument(
+        "--pool",
+        choices=["process", "thread"],
+        default="process",
+        help="Run the doc workers as processes or as threads in this process",
+    )
+    parser.add_argument(
+        "-b",
+        "--branch-name",
+        dest="branch_name",
+        default="main",
+        help="The name of the main branch of the collection",
+    )
+    parser.add_argument(
+        "--link-collection",
+        dest="link_collection",
+        action="store_true",
+        help="Link the collection in ~/.ansible/collections",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=add_docs.ENGINES,
+        default="ansible",
+        help="Read plugin docs with ansible-core, or with the lighter collection_prep reader",
+    )
+    timing.add_arguments(parser)
+    Cache.add_arguments(parser)
+
+    if argcomplete:
+        argcomplete.autocomplete(parser)
+
+    args = parser.parse_args()
+    with timing.instrument(args, "prepare"), Cache.from_args(args) as store:
+        failed = run_stages(
+            path=args.path,
+            stages=args.stages,
+            jobs=args.jobs,
+            pool=args.pool,
+            branch_name=args.branch_name,
+            link=args.link_collection,
+            store=store,
+            engine=args.engine,
+        )
+    sys.exit(int(bool(failed)))
+
+
+if __name__ == "__main__":
+    main()
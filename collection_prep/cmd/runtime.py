@@ -1,15 +1,22 @@
 """Get ready for 1.0.0."""
-import glob
+# The yaml libraries are imported where they are used, so --help doesn't pay for them
+# pylint: disable-msg=import-outside-toplevel
+import copy
+import io
 import logging
 import os
 
 from argparse import ArgumentParser
+from pathlib import Path
 
-import ruamel.yaml
-
-from collection_prep.utils import find_assignment_in_ast
+from collection_prep import timing
+from collection_prep.cache import Cache
+from collection_prep.cache import make_key
+from collection_prep.collection_index import CollectionIndex
+from collection_prep.utils import file_digest
 from collection_prep.utils import get_removed_at_date
-from collection_prep.utils import load_py_as_ast
+from collection_prep.utils import read_assignments
+from collection_prep.utils import write_if_changed
 
 
 logging.basicConfig(format="%(levelname)-10s%(message)s", level=logging.INFO)
@@ -29,118 +36,240 @@ def get_warning_msg():
     return "See the plugin documentation for more details"
 
 
+def plugin_routing_updates(collection, module_name, deprecated, index):
+    """Derive the routing entries a module contributes to runtime.yml.
+
+    :param collection: The name of the collection
+    :param module_name: The name of the module
+    :param deprecated: Whether the module is deprecated
+    :param index: The plugin files of the collection
+    :return: The section, name, entry and whether to merge the entry into an existing
+        one, for each update in the order they apply
+    """
+    updates = []
+    collection_name = collection.split(".")[-1]
+    try:
+        module_prefix = module_name.split("_")[0]
+    except IndexError:
+        module_prefix = module_name
+
+    short_name = module_name.split("_", 1)[-1]
+
+    # handle action plugin redirection
+    # if module name and action name is same skip the redirection as Ansible
+    # by design will invoke action plugin first.
+    if not index.has_action(module_name):
+        if index.has_action(module_prefix) and module_prefix == collection_name:
+            fq_action_name = f"{collection}.{module_prefix}"
+            updates.append(("action", module_name, {"redirect": fq_action_name}, False))
+            updates.append(("action", short_name, {"redirect": fq_action_name}, False))
+
+    # handle module short name redirection.
+    # Add short redirection if module prefix and collection name is same
+    # for example arista.eos.eos_acls will support redirection for arista.eos.acls
+    # as the prefix of module name (eos) is same as the collection name
+    if module_prefix == collection_name:
+        fq_module_name = f"{collection}.{module_name}"
+        updates.append(("modules", short_name, {"redirect": fq_module_name}, False))
+
+    # handle module deprecation notice
+    if deprecated:
+        logging.info("Found to be deprecated")
+        deprecation = {
+            "deprecation": {
+                "removal_date": get_removed_at_date(),
+                "warning_text": get_warning_msg(),
+            }
+        }
+        updates.append(("modules", module_name, deprecation, False))
+        if module_prefix == collection_name:
+            updates.append(("modules", short_name, deprecation, True))
+    return updates
+
+
+def module_contribution(collection, fullpath, index, model=None, store=None):
+    """Get the routing updates of a module, reusing the cached ones if still valid.
+
+    With a model shared with the other stages, the module is read from it and its
+    documentation parsed the way the doc generator does, so it can be reused there.
+
+    :param collection: The name of the collection
+    :param fullpath: The full path to the module
+    :param index: The plugin files of the collection
+    :param model: The plugin files of the collection shared with the other stages, if any
+    :param store: The cache shared with the other commands and runs, if enabled
+    :return: The updates of the module, and whether they were cached
+    """
+    import yaml
+
+    try:
+        from yaml import CSafeLoader as SafeLoader
+    except ImportError:
+        from yaml import SafeLoader
+
+    module_name = os.path.basename(fullpath).split(".")[0]
+    module_prefix = module_name.split("_")[0]
+    if store:
+        key = make_key(
+            model.digest(fullpath) if model else file_digest(fullpath),
+            index.has_action(module_name),
+            index.has_action(module_prefix),
+            get_removed_at_date(),
+            collection,
+        )
+        cached = store.get("runtime", key)
+        if cached is not None:
+            return cached, True
+
+    logging.info("-------------------Processing runtime.yml for module %s", module_name)
+
+    if model:
+        with timing.phase("parse", fullpath):
+            doc_section = model.docstring(fullpath)["doc"] or {}
+    else:
+        with timing.phase("parse", fullpath):
+            documentation = read_assignments(fullpath, {"DOCUMENTATION"})["DOCUMENTATION"]
+        with timing.phase("yaml", fullpath):
+            # Only the top level keys are read, so the layout preserving loader isn't needed
+            doc_section = yaml.load(documentation, Loader=SafeLoader)
+    updates = plugin_routing_updates(collection, module_name, "deprecated" in doc_section, index)
+    if store:
+        store.put("runtime", key, updates)
+    return updates, False
+
+
 def process_runtime_plugin_routing(
-    collection, path
-):  # pylint: disable-msg=too-many-locals,too-many-branches
+    collection, path, model=None, store=None
+):  # pylint: disable-msg=too-many-locals
     """Process collection plugins to generate a plugin routing map.
 
-    :param collection: The name of the collection
-    :param path: The collections path
+    The updates of a module are reused from the cache when the module, the action
+    plugins it may redirect to and the removal date are unchanged.
+
+    :param collection: The name of the collection, namespace.name
+    :param path: The path to the collection
+    :param model: The plugin files of the collection shared with the other stages, if any
+    :param store: The cache shared with the other commands and runs, if enabled
     :return: A dictionary representing plugins and redirects and deprecations
     """
     plugin_routing = {}
-    plugins_path = f"{path}/{collection}/plugins"
-    modules_path = f"{plugins_path}/modules"
-    action_path = f"{plugins_path}/action"
-
-    collection = collection.replace("/", ".")
-    collection_name = collection.split(".")[-1]
-    if not collection_name:
-        logging.error("failed to get collection name from %s", collection)
+    modules = 0
+    reused = 0
+    index = model.index if model else CollectionIndex(path)
+    modules_path = os.path.join(index.path, "plugins", "modules")
 
-    for fullpath in sorted(glob.glob(f"{modules_path}/*.py")):
-        filename = fullpath.split("/")[-1]
-        if not filename.endswith(".py") or filename.endswith("__init__.py"):
+    for filename in sorted(index.names("modules") or ()):
+        if filename.startswith(".") or filename.endswith("__init__.py"):
             continue
 
-        module_name = filename.split(".")[0]
-
-        logging.info("-------------------Processing runtime.yml for module %s", module_name)
-
-        ast_obj = load_py_as_ast(fullpath)
-        documentation = find_assignment_in_ast(ast_file=ast_obj, name="DOCUMENTATION")
-        doc_section = ruamel.yaml.load(documentation.value.to_python(), ruamel.yaml.RoundTripLoader)
-
-        try:
-            module_prefix = module_name.split("_")[0]
-        except IndexError:
-            module_prefix = module_name
-
-        short_name = module_name.split("_", 1)[-1]
-
-        # handle action plugin redirection
-        # if module name and action name is same skip the redirection as Ansible
-        # by design will invoke action plugin first.
-        if not os.path.exists(os.path.join(action_path, f"{module_name}.py")):
-            if (
-                os.path.exists(os.path.join(action_path, f"{module_prefix}.py"))
-                and module_prefix == collection_name
-            ):
-                fq_action_name = f"{collection}.{module_prefix}"
-                if not plugin_routing.get("action"):
-                    plugin_routing["action"] = {}
-                plugin_routing["action"].update({module_name: {"redirect": fq_action_name}})
-                plugin_routing["action"].update({short_name: {"redirect": fq_action_name}})
-
-        # handle module short name redirection.
-        # Add short redirection if module prefix and collection name is same
-        # for example arista.eos.eos_acls will support redirection for arista.eos.acls
-        # as the prefix of module name (eos) is same as the collection name
-        if module_prefix == collection_name:
-            fq_module_name = f"{collection}.{module_name}"
-            if not plugin_routing.get("modules"):
-                plugin_routing["modules"] = {}
-            plugin_routing["modules"].update({short_name: {"redirect": fq_module_name}})
-
-        # handle module deprecation notice
-        if "deprecated" in doc_section:
-            logging.info("Found to be deprecated")
-            if not plugin_routing.get("modules"):
-                plugin_routing["modules"] = {}
-            plugin_routing["modules"].update(
-                {
-                    module_name: {
-                        "deprecation": {
-                            "removal_date": get_removed_at_date(),
-                            "warning_text": get_warning_msg(),
-                        }
-                    }
-                }
-            )
-            if module_prefix == collection_name:
-                if not plugin_routing["modules"].get(short_name):
-                    plugin_routing["modules"][short_name] = {}
-
-                plugin_routing["modules"][short_name].update(
-                    {
-                        "deprecation": {
-                            "removal_date": get_removed_at_date(),
-                            "warning_text": get_warning_msg(),
-                        }
-                    }
-                )
-
+        updates, cached = module_contribution(
+            collection, f"{modules_path}/{filename}", index, model, store
+        )
+        modules += 1
+        reused += cached
+
+        for section, name, entry, merge in updates:
+            routing = plugin_routing.setdefault(section, {})
+            if merge:
+                routing.setdefault(name, {}).update(copy.deepcopy(entry))
+            else:
+                routing[name] = copy.deepcopy(entry)
+
+    if reused:
+        logging.info("Reused the routing of %s of %s modules", reused, modules)
     return plugin_routing
 
 
-def process(collection, path):
+def is_generated(collection, section, name, entry):
+    """Check whether a routing entry has the exact shape plugin_routing_updates gives it.
+
+    :param collection: The name of the collection
+    :param section: The plugin routing section of the entry
+    :param name: The name of the entry
+    :param entry: The entry
+    :return: True if the entry could have been generated, so it may be removed
+    """
+    collection_name = collection.split(".")[-1]
+    if section not in ("action", "modules") or not isinstance(entry, dict) or not entry:
+        return False
+    if set(entry) - ({"redirect", "deprecation"} if section == "modules" else {"redirect"}):
+        return False
+    if "redirect" in entry:
+        if section == "action":
+            target = f"{collection}.{collection_name}"
+        else:
+            target = f"{collection}.{collection_name}_{name}"
+        if entry["redirect"] != target:
+            return False
+    if "deprecation" in entry:
+        deprecation = entry["deprecation"]
+        if not isinstance(deprecation, dict) or set(deprecation) != {
+            "removal_date",
+            "warning_text",
+        }:
+            return False
+        if deprecation["warning_text"] != get_warning_msg():
+            return False
+    return True
+
+
+def merge_plugin_routing(runtime, plugin_routing, collection):
+    """Merge generated plugin routing into the contents of an existing runtime.yml.
+
+    The entries written by hand come first in each section, with their comments,
+    followed by the generated entries. Entries shaped like generated ones that are no
+    longer generated, because their module is gone or changed, are removed, every
+    other entry is kept. Nothing outside runtime.yml is needed to tell them apart.
+
+    :param runtime: The contents of runtime.yml
+    :param plugin_routing: The generated plugin routing
+    :param collection: The name of the collection
+    """
+    existing = runtime.get("plugin_routing") or {}
+    for section in [*existing, *(section for section in plugin_routing if section not in existing)]:
+        entries = existing.get(section)
+        new = plugin_routing.get(section, {})
+        if entries is None:
+            existing[section] = new
+            continue
+        stale = [
+            name
+            for name, entry in entries.items()
+            if name not in new and is_generated(collection, section, name, entry)
+        ]
+        for name in [*stale, *new]:
+            entries.pop(name, None)
+        entries.update(new)
+        if not entries:
+            del existing[section]
+    if existing:
+        runtime["plugin_routing"] = existing
+    else:
+        runtime.pop("plugin_routing", None)
+
+
+def process(collection, path, model=None, store=None):
     """Generate or update runtime.yml on a collection.
 
+    Plugin routing written by hand in an existing runtime.yml is kept.
+
     :param collection: The collection name
     :param path: The collections path
+    :param model: The plugin files of the collection shared with the other stages, if any
+    :param store: The cache shared with the other commands and runs, if enabled
     """
-    rt_obj = {}
-    collection_path = os.path.join(path, collection)
+    import ruamel.yaml
+
+    collection_path = model.path if model else os.path.join(path, collection)
     if not os.path.exists(collection_path):
         logging.error("%s does not exist", collection_path)
 
-    supported_ansible_versions = COLLECTION_MIN_ANSIBLE_VERSION
-    if COLLECTION_MAX_ANSIBLE_VERSION:
-        supported_ansible_versions += "," + COLLECTION_MAX_ANSIBLE_VERSION
-    rt_obj["requires_ansible"] = supported_ansible_versions
-    plugin_routing = process_runtime_plugin_routing(collection, path)
-    if plugin_routing:
-        rt_obj["plugin_routing"] = plugin_routing
+    # The generated redirects and the entries recognized as generated use the dotted name
+    collection = collection.replace("/", ".")
+    if not collection.split(".")[-1]:
+        logging.error("failed to get collection name from %s", collection)
+
+    plugin_routing = process_runtime_plugin_routing(collection, collection_path, model, store)
 
     # create meta/runtime.yml file
     meta_path = os.path.join(collection_path, "meta")
@@ -152,8 +281,23 @@ def process(collection, path):
     yaml = ruamel.yaml.YAML()
     yaml.explicit_start = True
 
-    with open(runtime_path, "w", encoding="utf8") as file_obj:
-        yaml.dump(rt_obj, file_obj)
+    rt_obj = {}
+    if os.path.exists(runtime_path):
+        rt_obj = yaml.load(Path(runtime_path)) or {}
+
+    supported_ansible_versions = COLLECTION_MIN_ANSIBLE_VERSION
+    if COLLECTION_MAX_ANSIBLE_VERSION:
+        supported_ansible_versions += "," + COLLECTION_MAX_ANSIBLE_VERSION
+    rt_obj["requires_ansible"] = supported_ansible_versions
+    merge_plugin_routing(rt_obj, plugin_routing, collection)
+
+    stream = io.StringIO()
+    yaml.dump(rt_obj, stream)
+    with timing.phase("write"):
+        if write_if_changed(runtime_path, stream.getvalue()):
+            logging.info("Wrote %s", runtime_path)
+        else:
+            logging.info("%s is unchanged", runtime_path)
 
 
 def main():
@@ -161,8 +305,11 @@ def main():
     parser = ArgumentParser()
     parser.add_argument("-c", "--collection", help="The name of the collection", required=True)
     parser.add_argument("-p", "--path", help="The path to the collection", required=True)
+    timing.add_arguments(parser)
+    Cache.add_arguments(parser)
     args = parser.parse_args()
-    process(collection=args.collection, path=args.path)
+    with timing.instrument(args, "runtime"), Cache.from_args(args) as store:
+        process(collection=args.collection, path=args.path, store=store)
 
 
 if __name__ == "__main__":
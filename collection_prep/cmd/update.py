@@ -1,18 +1,28 @@
 """Get ready for 1.0.0."""
+# ruamel.yaml and redbaron are imported where they are used, so --help doesn't pay for them
+# pylint: disable-msg=import-outside-toplevel
+import difflib
 import logging
 import os
-import platform
 import re
 import subprocess
 import sys
+import tempfile
+import traceback
 
 from argparse import ArgumentParser
-
-import ruamel.yaml
-
-from collection_prep.utils import find_assignment_in_ast
+from pathlib import Path
+
+from collection_prep import timing
+from collection_prep.cache import Cache
+from collection_prep.cache import make_key
+from collection_prep.cache import package_version
+from collection_prep.collection_index import CollectionIndex
+from collection_prep.collection_model import CollectionModel
 from collection_prep.utils import get_removed_at_date
+from collection_prep.utils import index_assignments
 from collection_prep.utils import load_py_as_ast
+from collection_prep.utils import write_if_changed
 
 
 logging.basicConfig(format="%(levelname)-10s%(message)s", level=logging.INFO)
@@ -30,30 +40,97 @@ SUBDIRS = (
     "inventory",
 )
 SPECIALS = {"ospfv2": "OSPFv2", "interfaces": "Interfaces", "static": "Static"}
+# Stay well below the command line length limits, the lowest being 32767 on Windows
+BLACK_ARGS_LENGTH = 30000
 
 
-def remove_assignment_in_ast(name, ast_file):
+def remove_assignment_in_ast(name, ast_file, assignments=None):
     """Remove an assignment in an ast object.
 
     :param name: The name of the assignment to remove
     :param ast_file: The ast object
+    :param assignments: The index of assignments in the ast object, kept up to date
     """
-    res = ast_file.find("assignment", target=lambda x: x.dumps() == name)
+    if assignments is None:
+        res = ast_file.find("assignment", target=lambda x: x.dumps() == name)
+    else:
+        res = assignments.pop(name, None)
     if res:
         ast_file.remove(res)
 
 
-def retrieve_plugin_name(plugin_type, body_part):
+class PluginDocument:
+    """The YAML sections of a plugin file, each parsed once and written back once.
+
+    Sections are parsed on first use. The sections marked as modified are dumped
+    by save, after passing their lines through the filters registered for them.
+    """
+
+    def __init__(self, assignments):
+        """Initialize the document.
+
+        :param assignments: The index of assignments in the plugin's ast object
+        """
+        self.assignments = assignments
+        self.sections = {}
+        self.filters = {}
+
+    def __contains__(self, name):
+        """Check whether the plugin file assigns a section.
+
+        :param name: The name of the section
+        :return: True if the section is assigned
+        """
+        return bool(self.assignments.get(name))
+
+    def get(self, name):
+        """Get a section, parsing it on first use.
+
+        :param name: The name of the section
+        :return: The parsed section
+        """
+        import ruamel.yaml
+
+        if name not in self.sections:
+            self.sections[name] = ruamel.yaml.load(
+                self.assignments[name].value.to_python(), ruamel.yaml.RoundTripLoader
+            )
+        return self.sections[name]
+
+    def modify(self, name, line_filter=None):
+        """Mark a section to be written back.
+
+        :param name: The name of the section
+        :param line_filter: A function applied to the dumped lines of the section
+        """
+        filters = self.filters.setdefault(name, [])
+        if line_filter is not None:
+            filters.append(line_filter)
+
+    def save(self):
+        """Dump each modified section back into its assignment."""
+        import ruamel.yaml
+
+        for name, filters in self.filters.items():
+            lines = ruamel.yaml.dump(
+                self.sections[name], None, ruamel.yaml.RoundTripDumper
+            ).splitlines()
+            for line_filter in filters:
+                lines = line_filter(lines)
+            self.assignments[name].value.replace('"""\n' + "\n".join(lines) + '\n"""')
+
+
+def retrieve_plugin_name(plugin_type, document):
     """Retrieve the module name from a docstring.
 
     :param plugin_type: The plugin's type
-    :param body_part: The docstring extracted from the ast body
+    :param document: The YAML sections of the plugin
     :return: The module name
     """
-    if not body_part:
+    if "DOCUMENTATION" not in document:
         logging.warning("Failed to find DOCUMENTATION assignment")
         return ""
-    documentation = ruamel.yaml.load(body_part.value.to_python(), ruamel.yaml.RoundTripLoader)
+    documentation = document.get("DOCUMENTATION")
 
     if plugin_type == "modules":
         plugin_type = "module"
@@ -72,15 +149,25 @@ def update_deprecation_notice(documentation):
         documentation["deprecated"].pop("removed_in", None)
 
 
-def update_documentation(body_part):
+def remove_nested_version_added(lines):
+    """Remove version_added from anywhere in the docstring if preceded by 1+ spaces.
+
+    :param lines: The lines of the dumped DOCUMENTATION
+    :return: The lines without a nested version_added
+    """
+    regex = re.compile(r"^\s+version_added\:\s.*$")
+    return [line for line in lines if not re.match(regex, line)]
+
+
+def update_documentation(document):
     """Update the documentation of the module.
 
-    :param body_part: The DOCUMENTATION section of the module
+    :param document: The YAML sections of the module
     """
-    if not body_part:
+    if "DOCUMENTATION" not in document:
         logging.warning("Failed to find DOCUMENTATION assignment")
         return
-    documentation = ruamel.yaml.load(body_part.value.to_python(), ruamel.yaml.RoundTripLoader)
+    documentation = document.get("DOCUMENTATION")
 
     # update deprecation to removed_at_date
     update_deprecation_notice(documentation)
@@ -90,63 +177,58 @@ def update_documentation(body_part):
     desc_idx = [idx for idx, key in enumerate(documentation.keys()) if key == "description"]
     # insert version_added after the description
     documentation.insert(desc_idx[0] + 1, key="version_added", value="1.0.0")
-    repl = ruamel.yaml.dump(documentation, None, ruamel.yaml.RoundTripDumper)
-
-    # remove version added from anywhere else in the docstring if preceded by 1+ spaces
-    example_lines = repl.splitlines()
-    regex = re.compile(r"^\s+version_added\:\s.*$")
-    example_lines = [line for line in example_lines if not re.match(regex, line)]
-    body_part.value.replace('"""\n' + "\n".join(example_lines) + '\n"""')
+    document.modify("DOCUMENTATION", remove_nested_version_added)
 
 
-def update_examples(body_part, module_name, collection):
+def update_examples(document, module_name, collection):
     """Update the example.
 
-    :param body_part: The EXAMPLE section of the module
+    :param document: The YAML sections of the module
     :param module_name: The name of the module
     :param collection: The name of the collection
     """
-    if not body_part:
+    import ruamel.yaml
+
+    if "EXAMPLES" not in document:
         logging.warning("Failed to find EXAMPLES assignment")
         return
     full_module_name = f"{collection}.{module_name}"
-    example = ruamel.yaml.load(body_part.value.to_python(), ruamel.yaml.RoundTripLoader)
+    example = document.get("EXAMPLES")
     # check each task and update to fqcn
     for idx, task in enumerate(example):
         example[idx] = ruamel.yaml.comments.CommentedMap(
             [(full_module_name, v) if k == module_name else (k, v) for k, v in task.items()]
         )
 
-    repl = ruamel.yaml.dump(example, None, ruamel.yaml.RoundTripDumper)
+    def qualify_comments(example_lines):
+        # look in yaml comments for the module name as well and replace
+        for idx, line in enumerate(example_lines):
+            if (
+                line.startswith("#")
+                and module_name in line
+                and module_name
+                and full_module_name not in line
+            ):
+                example_lines[idx] = line.replace(module_name, full_module_name)
+        return example_lines
 
-    # look in yaml comments for the module name as well and replace
-    example_lines = repl.splitlines()
-    for idx, line in enumerate(example_lines):
-        if (
-            line.startswith("#")
-            and module_name in line
-            and module_name
-            and full_module_name not in line
-        ):
-            example_lines[idx] = line.replace(module_name, full_module_name)
-    body_part.value.replace('"""\n' + "\n".join(example_lines) + '\n"""')
+    document.modify("EXAMPLES", qualify_comments)
 
 
-def update_short_description(return_, documentation, module_name):
+def update_short_description(document, module_name):
     """Update the short description of the module.
 
-    :param return_: The RETURN section of the module
-    :param documentation: The DOCUMENTATION section of the module
+    :param document: The YAML sections of the module
     :param module_name: The module name
     """
-    if not return_:
+    if "RETURN" not in document:
         logging.warning("Failed to find RETURN assignment")
         return
-    ret_section = ruamel.yaml.load(return_.value.to_python(), ruamel.yaml.RoundTripLoader)
-    if not documentation:
+    ret_section = document.get("RETURN")
+    if "DOCUMENTATION" not in document:
         logging.warning("Failed to find DOCUMENTATION assignment")
         return
-    doc_section = ruamel.yaml.load(documentation.value.to_python(), ruamel.yaml.RoundTripLoader)
+    doc_section = document.get("DOCUMENTATION")
     short_description = doc_section["short_description"]
 
     rm_rets = ["after", "before", "commands"]
@@ -176,93 +258,442 @@ def update_short_description(return_, documentation, module_name):
     if short_description != doc_section["short_description"]:
         logging.info("Setting short description to '%s'", short_description)
         doc_section["short_description"] = short_description
-        repl = ruamel.yaml.dump(doc_section, None, ruamel.yaml.RoundTripDumper)
-        documentation.value.replace('"""\n' + repl + '\n"""')
+        document.modify("DOCUMENTATION")
+
+
+def black(filenames, config=None):
+    """Run black against the files, in as few invocations as the command line allows.
+
+    :param filenames: The full paths to the files
+    :param config: The black configuration file to use
+    """
+    logging.info("Running black against %s files", len(filenames))
+    command = ["black", "-q"]
+    if config:
+        command += ["--config", str(config)]
+    chunk = []
+    length = 0
+    for filename in filenames:
+        if chunk and length + len(filename) + 1 > BLACK_ARGS_LENGTH:
+            subprocess.check_output([*command, *chunk])
+            chunk = []
+            length = 0
+        chunk.append(filename)
+        length += len(filename) + 1
+    if chunk:
+        subprocess.check_output([*command, *chunk])
+
+
+def black_config(path):
+    """Find the black configuration black would use for files in a directory.
+
+    Like black, stop at the first directory holding a pyproject.toml or a repository.
+
+    :param path: The directory
+    :return: The pyproject.toml to use, or None
+    """
+    path = Path(path).absolute()
+    for directory in (path, *path.parents):
+        if any((directory / marker).exists() for marker in (".git", ".hg", "pyproject.toml")):
+            config = directory / "pyproject.toml"
+            return config if config.is_file() else None
+    return None
+
 
+def format_contents(contents, config=None):
+    """Format the contents of files with black, in a temporary directory.
 
-def black(filename):
-    """Run black against the file.
+    :param contents: A mapping of file names to contents
+    :param config: The black configuration file to use
+    :return: A mapping of file names to formatted contents
+    """
+    with tempfile.TemporaryDirectory() as tempdir:
+        paths = {}
+        for index, (filename, text) in enumerate(contents.items()):
+            paths[filename] = os.path.join(tempdir, f"{index}_{os.path.basename(filename)}")
+            with open(paths[filename], "w", encoding="utf8", newline="") as file_obj:
+                file_obj.write(text)
+        black(list(paths.values()), config)
+        formatted = {}
+        for filename, temp_path in paths.items():
+            with open(temp_path, encoding="utf8", newline="") as file_obj:
+                formatted[filename] = file_obj.read()
+    return formatted
+
+
+def update_file(collection, subdir, filename, source=None):
+    """Update a single plugin file.
 
+    :param collection: The name of the collection
+    :param subdir: The plugin directory the file lives in
     :param filename: The full path to the file
+    :param source: The contents of the file, read from disk if not given
+    :return: The updated contents of the file, before black, or None if it was skipped
     """
-    logging.info("Running black against %s", filename)
-    subprocess.check_output(["black", "-q", filename])
+    logging.info("-------------------Processing %s", filename)
+    with timing.phase("parse", filename):
+        ast_obj = load_py_as_ast(filename, source)
+        assignments = index_assignments(ast_obj)
+
+    # Get the module name from the docstring
+    document = PluginDocument(assignments)
+    with timing.phase("name", filename):
+        module_name = retrieve_plugin_name(subdir, document)
+    if not module_name:
+        logging.warning("Skipped %s: No module name found", filename)
+        return None
+
+    # Remove the metadata
+    with timing.phase("metadata", filename):
+        remove_assignment_in_ast(ast_file=ast_obj, name="ANSIBLE_METADATA", assignments=assignments)
+    logging.info("Removed metadata in %s", filename)
+
+    # Update the documentation
+    with timing.phase("documentation", filename):
+        update_documentation(document)
+    logging.info("Updated documentation in %s", filename)
+
+    if subdir == "modules":
+        # Update the short description
+        with timing.phase("short_description", filename):
+            update_short_description(document, module_name)
+
+        # Update the examples
+        with timing.phase("examples", filename):
+            update_examples(document, module_name, collection)
+        logging.info("Updated examples in %s", filename)
+
+    # Every section is dumped once, after all the updates
+    with timing.phase("dump", filename):
+        document.save()
+        return ast_obj.dumps()
+
+
+class LogBuffer(logging.Handler):
+    """Keep log records so a worker can return them to be emitted in file order."""
+
+    def __init__(self):
+        """Initialize the buffer."""
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        """Keep a record, with its message formatted so it can be pickled.
+
+        :param record: The log record
+        """
+        self.records.append(
+            {
+                "name": record.name,
+                "levelno": record.levelno,
+                "levelname": record.levelname,
+                "msg": record.getMessage(),
+            }
+        )
 
 
-def process(collection, path):
-    """Process the files in each subdirectory.
+def update_file_in_worker(collection, subdir, filename, source=None):
+    """Update a single plugin file in a worker process, buffering its logs.
+
+    :param collection: The name of the collection
+    :param subdir: The plugin directory the file lives in
+    :param filename: The full path to the file
+    :param source: The contents of the file, read from disk if not given
+    :return: The updated contents, the error if it failed, its log records
+        and its timing records
+    """
+    root = logging.getLogger()
+    buffer = LogBuffer()
+    handlers, root.handlers = root.handlers, [buffer]
+    error = None
+    try:
+        with timing.capture(filename) as records:
+            try:
+                contents = update_file(collection, subdir, filename, source)
+            except Exception:  # pylint: disable-msg=broad-exception-caught
+                contents, error = None, traceback.format_exc()
+    finally:
+        root.handlers = handlers
+    return contents, error, buffer.records, records
+
+
+def list_files(collection, path, index=None):
+    """List the plugin files to update.
 
     :param collection: The name of the collection
     :param path: The collections path
+    :param index: The plugin files of the collection, listed again if not given
+    :return: The plugin directory and full path of each file
     """
+    index = index or CollectionIndex(f"{path}{collection}")
+    tasks = []
     for subdir in SUBDIRS:
-        dirpath = f"{path}{collection}/plugins/{subdir}"
-        try:
-            plugin_files = os.listdir(dirpath)
-        except FileNotFoundError:
+        plugin_files = index.names(subdir)
+        if plugin_files is None:
             # Looks like we don't have any of that type of plugin here
             continue
+        dirpath = f"{index.path}/plugins/{subdir}"
+        tasks.extend((subdir, f"{dirpath}/{filename}") for filename in plugin_files)
+    return tasks
 
-        for filename in plugin_files:
-            if filename.endswith(".py"):
-                filename = f"{dirpath}/{filename}"
-                logging.info("-------------------Processing %s", filename)
-                ast_obj = load_py_as_ast(filename)
 
-                # Get the module name from the docstring
-                module_name = retrieve_plugin_name(
-                    subdir,
-                    find_assignment_in_ast(ast_file=ast_obj, name="DOCUMENTATION"),
-                )
-                if not module_name:
-                    logging.warning("Skipped %s: No module name found", filename)
-                    continue
+def update_serially(collection, tasks, model=None):
+    """Update each file in this process.
+
+    :param collection: The name of the collection
+    :param tasks: The plugin directory and full path of each file
+    :param model: The plugin files of the collection shared with the other stages, if any
+    :yield: Each file, its updated contents and whether it failed
+    """
+    for subdir, filename in tasks:
+        try:
+            source = model.source(filename) if model else None
+            yield filename, update_file(collection, subdir, filename, source), False
+        except Exception:  # pylint: disable-msg=broad-exception-caught
+            logging.exception("Failed to update %s", filename)
+            yield filename, None, True
+
+
+def update_in_workers(collection, tasks, jobs, model=None):
+    """Update the files in a pool of worker processes.
 
-                # Remove the metadata
-                remove_assignment_in_ast(ast_file=ast_obj, name="ANSIBLE_METADATA")
-                logging.info("Removed metadata in %s", filename)
+    The logs of each file are emitted once it is done, in the order of the files.
 
-                # Update the documentation
-                update_documentation(
-                    body_part=find_assignment_in_ast(ast_file=ast_obj, name="DOCUMENTATION")
+    :param collection: The name of the collection
+    :param tasks: The plugin directory and full path of each file
+    :param jobs: The number of worker processes
+    :param model: The plugin files of the collection shared with the other stages, if any
+    :yield: Each file, its updated contents and whether it failed
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    logging.info("Updating %s files with %s workers", len(tasks), jobs)
+    sources = [model.source(filename) if model else None for _subdir, filename in tasks]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(
+            update_file_in_worker, [collection] * len(tasks), *zip(*tasks), sources
+        )
+        for (_subdir, filename), (contents, error, logs, records) in zip(tasks, results):
+            for record in logs:
+                logging.getLogger(record["name"]).handle(logging.makeLogRecord(record))
+            timing.extend(records)
+            if error:
+                logging.error("Failed to update %s\n%s", filename, error.rstrip())
+            yield filename, contents, bool(error)
+
+
+def update_key(collection, subdir, filename, model):
+    """Build the cache key of the update of a plugin file.
+
+    :param collection: The name of the collection
+    :param subdir: The plugin directory the file lives in
+    :param filename: The full path to the file
+    :param model: The plugin files of the collection
+    :return: The key
+    """
+    return make_key(
+        model.digest(filename),
+        collection,
+        subdir,
+        get_removed_at_date(),
+        package_version("ruamel.yaml"),
+        package_version("redbaron"),
+    )
+
+
+def read_cached(collection, tasks, model, store):
+    """Look up the updates of plugin files in the cache.
+
+    :param collection: The name of the collection
+    :param tasks: The plugin directory and full path of each file
+    :param model: The plugin files of the collection
+    :param store: The cache
+    :return: The cache key of each file, and the updated contents of the files found
+    """
+    keys = {}
+    cached = {}
+    for subdir, filename in tasks:
+        keys[filename] = update_key(collection, subdir, filename, model)
+        value = store.get("update", keys[filename])
+        if value is not None:
+            cached[filename] = value["contents"]
+    logging.info("Reused the update of %s of %s files", len(cached), len(tasks))
+    return keys, cached
+
+
+def merge_cached(tasks, cached, results, keys, store):
+    """Merge the cached updates with the others, caching those.
+
+    :param tasks: The plugin directory and full path of each file
+    :param cached: The updated contents of the files found in the cache
+    :param results: Each other file, its updated contents and whether it failed
+    :param keys: The cache key of each file
+    :param store: The cache
+    :yield: Each file, its updated contents and whether it failed, in the order of the tasks
+    """
+    filenames = iter(filename for _subdir, filename in tasks)
+    for filename, contents, error in results:
+        # The cached files between the previous file updated and this one
+        for previous in filenames:
+            if previous == filename:
+                break
+            yield previous, cached[previous], False
+        if not error:
+            store.put("update", keys[filename], {"contents": contents})
+        yield filename, contents, error
+    for previous in filenames:
+        yield previous, cached[previous], False
+
+
+def apply_updates(originals, formatted, dry_run=False, diff=False):
+    """Write the files whose formatted contents differ from what is on disk.
+
+    :param originals: A mapping of file names to their contents on disk
+    :param formatted: A mapping of file names to their updated and formatted contents
+    :param dry_run: Don't write the files
+    :param diff: Print a unified diff of each change instead of writing the file
+    :return: The files with changes
+    """
+    changed = []
+    for filename, original in originals.items():
+        if formatted[filename] == original:
+            logging.info("Unchanged %s", filename)
+            continue
+        changed.append(filename)
+        if diff:
+            sys.stdout.writelines(
+                difflib.unified_diff(
+                    original.splitlines(keepends=True),
+                    formatted[filename].splitlines(keepends=True),
+                    fromfile=filename,
+                    tofile=filename,
                 )
-                logging.info("Updated documentation in %s", filename)
-
-                if subdir == "modules":
-                    # Update the short description
-                    update_short_description(
-                        return_=find_assignment_in_ast(ast_file=ast_obj, name="RETURN"),
-                        documentation=find_assignment_in_ast(
-                            ast_file=ast_obj, name="DOCUMENTATION"
-                        ),
-                        module_name=module_name,
-                    )
-
-                    # Update the examples
-                    update_examples(
-                        body_part=find_assignment_in_ast(ast_file=ast_obj, name="EXAMPLES"),
-                        module_name=module_name,
-                        collection=collection,
-                    )
-                    logging.info("Updated examples in %s", filename)
-
-                # Write out the file and black
-                file_contents = ast_obj.dumps()
-                with open(filename, "w", encoding="utf8") as file_obj:
-                    file_obj.write(file_contents)
-                    logging.info("Wrote %s", filename)
-                black(filename)
+            )
+            sys.stdout.flush()
+        if dry_run or diff:
+            logging.info("Would update %s", filename)
+            continue
+        with timing.phase("write", filename):
+            write_if_changed(filename, formatted[filename])
+        logging.info("Wrote %s", filename)
+    return changed
+
+
+def collect_updates(results, model=None):
+    """Keep the updated contents that differ from the files on disk.
+
+    :param results: Each file, its updated contents and whether it failed
+    :param model: The plugin files of the collection shared with the other stages, if any
+    :return: The contents on disk and the updated contents of the files with
+        changes, and the files that failed to update
+    """
+    originals = {}
+    updated = {}
+    failed = []
+    for filename, contents, error in results:
+        if error:
+            failed.append(filename)
+            continue
+        if contents is None:
+            continue
+        if model:
+            original = model.source(filename)
+        else:
+            with open(filename, encoding="utf8", newline="") as file_obj:
+                original = file_obj.read()
+        if contents == original:
+            # Nothing for black to do either
+            logging.info("Unchanged %s", filename)
+            continue
+        originals[filename] = original
+        updated[filename] = contents
+    return originals, updated, failed
+
+
+def process(
+    collection, path, jobs=1, dry_run=False, diff=False, model=None, store=None
+):  # pylint: disable-msg=too-many-arguments,too-many-positional-arguments,too-many-locals
+    """Process the files in each subdirectory.
+
+    The updated files are formatted with black in a temporary directory, so files
+    the update leaves as they were are not touched.
+
+    :param collection: The name of the collection
+    :param path: The collections path
+    :param jobs: The number of worker processes
+    :param dry_run: Don't write the files
+    :param diff: Print a unified diff of each change instead of writing the file
+    :param model: The plugin files of the collection shared with the other stages, if any
+    :param store: The cache shared with the other commands and runs, if enabled
+    :return: The files that failed to update and the files with changes
+    """
+    if store is not None and model is None:
+        # The cache keys need the contents of every file, read them once
+        model = CollectionModel(collection, f"{path}{collection}")
+    tasks = list_files(collection, path, model.index if model else None)
+    keys, cached = read_cached(collection, tasks, model, store) if store else ({}, {})
+    pending = [task for task in tasks if task[1] not in cached]
+    if jobs > 1 and len(pending) > 1:
+        results = update_in_workers(collection, pending, jobs, model)
+    else:
+        results = update_serially(collection, pending, model)
+    if store:
+        results = merge_cached(tasks, cached, results, keys, store)
+    originals, updated, failed = collect_updates(results, model)
+
+    formatted = {}
+    if updated:
+        with timing.phase("black"):
+            collection_path = model.path if model else f"{path}{collection}"
+            formatted = format_contents(updated, black_config(collection_path))
+    changed = apply_updates(originals, formatted, dry_run=dry_run, diff=diff)
+    if model and changed and not (dry_run or diff):
+        for filename in changed:
+            model.update(filename, formatted[filename])
+        model.refresh()
+
+    if failed:
+        logging.error("Failed to update %s of %s files", len(failed), len(tasks))
+    if dry_run or diff:
+        logging.info("%s of %s files would be updated", len(changed), len(tasks))
+    return failed, changed
 
 
 def main():
     """Run the script."""
-    if not platform.python_version().startswith("3.8"):
-        sys.exit("Python 3.8+ required")
     parser = ArgumentParser()
     parser.add_argument("-c", "--collection", help="The name of the collection", required=True)
     parser.add_argument("-p", "--path", help="The path to the collection", required=True)
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="The number of worker processes used to update plugin files",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Don't write the files, exit with 1 if any would be updated",
+    )
+    parser.add_argument(
+        "--diff",
+        action="store_true",
+        help="Don't write the files, print a diff of the updates and exit with 1 if there are any",
+    )
+    timing.add_arguments(parser)
+    Cache.add_arguments(parser)
     args = parser.parse_args()
-    process(collection=args.collection, path=args.path)
+    with timing.instrument(args, "update"), Cache.from_args(args) as store:
+        failed, changed = process(
+            collection=args.collection,
+            path=args.path,
+            jobs=args.jobs,
+            dry_run=args.check,
+            diff=args.diff,
+            store=store,
+        )
+    sys.exit(int(bool(failed or (changed and (args.check or args.diff)))))
 
 
 if __name__ == "__main__":
@@ -1,19 +1,15 @@
 """Script to guess the next version of an ansible collection."""
 import logging
+import re
 import sys
 
 from argparse import ArgumentParser
+from functools import cache
 from pathlib import Path
 
-import ruamel.yaml
+from collection_prep import timing
 
 
-yaml = ruamel.yaml.YAML()
-# Preserve document layout
-yaml.block_seq_indent = 2
-yaml.explicit_start = True
-yaml.preserve_quotes = True
-
 try:
     import argcomplete
 except ImportError:
@@ -41,6 +37,25 @@ RULES = {
     ],
 }
 
+# A plain top-level mapping key, the only kind changelog fragments use
+TOP_LEVEL_KEY = re.compile(r"([A-Za-z_][\w-]*)[ \t]*:(?:[ \t]|$)")
+
+
+@cache
+def round_trip_yaml():
+    """Create the YAML handler, imported on first use to keep startup fast.
+
+    :return: A ruamel YAML instance that preserves document layout
+    """
+    import ruamel.yaml  # pylint: disable-msg=import-outside-toplevel
+
+    yaml = ruamel.yaml.YAML()
+    # Preserve document layout
+    yaml.block_seq_indent = 2
+    yaml.explicit_start = True
+    yaml.preserve_quotes = True
+    return yaml
+
 
 def get_last_version(path) -> str:
     """Get the last released version of a collection.
@@ -52,13 +67,65 @@ def get_last_version(path) -> str:
     if not changelog_path.exists():
         # Collection has not been released?
         return "0.0.0"
-    changelog = yaml.load(changelog_path)
+    with timing.phase("yaml", changelog_path.name):
+        changelog = round_trip_yaml().load(changelog_path)
     return max(changelog["releases"].keys())
 
 
+def scan_top_level_keys(text):
+    """Read the top-level keys of a YAML mapping without parsing the values.
+
+    Only the layout changelog fragments are written in is recognized, plain keys
+    at the start of a line with the values on the same line or indented below.
+
+    :param text: The YAML document
+    :return: The top-level keys, or None if the document needs a YAML parser
+    """
+    keys = set()
+    for line in text.splitlines():
+        if not line or line[0] in " \t#" or (line.rstrip() == "---" and not keys):
+            continue
+        if line.startswith("-") and line[1:2] in ("", " "):
+            if not keys:
+                # The document is a sequence, not a mapping
+                return None
+            continue
+        match = TOP_LEVEL_KEY.match(line)
+        if match is None or match.group(1) in keys:
+            return None
+        value = line[match.end() :].lstrip()
+        if value[:1] in ("'", '"', "[", "{"):
+            # Flow scalars and collections may span lines
+            return None
+        keys.add(match.group(1))
+    return keys
+
+
+def fragment_headings(file):
+    """Get the top-level keys of a changelog fragment.
+
+    The keys are scanned from the text, the YAML parser is only used for
+    fragments laid out in an unusual way.
+
+    :param file: The path to the changelog fragment
+    :return: The fragment headings, or the whole fragment if loaded by the YAML parser
+    """
+    with timing.phase("scan", f"changelogs/fragments/{file.name}"):
+        try:
+            headings = scan_top_level_keys(file.read_text(encoding="utf-8-sig"))
+        except UnicodeDecodeError:
+            headings = None
+    if headings is None:
+        with timing.phase("yaml", f"changelogs/fragments/{file.name}"):
+            headings = round_trip_yaml().load(file)
+    return headings or ()
+
+
 def update_version(path: Path, version: str) -> str:
     """Generate the likely next version of a collection.
 
+    The changelog fragments are read until one calls for a major version.
+
     :param path: The collection base path
     :param version: The current collection version
     :return: The expected next version
@@ -69,14 +136,15 @@ def update_version(path: Path, version: str) -> str:
     types = {key: False for key in RULES}
     if fragment_path.exists() and fragment_path.is_dir():
         for file in fragment_path.iterdir():
-            fragment = yaml.load(file)
-            if not fragment:
-                continue
+            fragment = fragment_headings(file)
 
             for level, headings in RULES.items():
                 for heading in headings:
                     if heading in fragment:
                         types[level] = True
+            if types["major"]:
+                # No other fragment can raise the version any higher
+                break
 
     # Bump version accordingly
     if types["major"]:
@@ -102,7 +170,8 @@ def update_galaxy(path: Path, new_version: str) -> bool:
     """
     galaxy_path = path / "galaxy.yml"
     if galaxy_path.exists():
-        galaxy = yaml.load(galaxy_path)
+        with timing.phase("yaml", galaxy_path.name):
+            galaxy = round_trip_yaml().load(galaxy_path)
     else:
         logging.error("Unable to find galaxy.yml in %s", path)
         sys.exit(2)
@@ -111,11 +180,27 @@ def update_galaxy(path: Path, new_version: str) -> bool:
     if galaxy["version"] != new_version:
         logging.info("Updating version string in galaxy.yml")
         galaxy["version"] = new_version
-        yaml.dump(galaxy, galaxy_path)
+        with timing.phase("write", galaxy_path.name):
+            round_trip_yaml().dump(galaxy, galaxy_path)
         return True
     return False
 
 
+def process(path: Path) -> bool:
+    """Guess the next version of a collection and update galaxy.yml with it.
+
+    :param path: The collection base path
+    :return: True if galaxy.yml needed to be updated otherwise False
+    """
+    version = get_last_version(path)
+    logging.info("Detected collection version is %s", version)
+
+    new_version = update_version(path, version)
+    logging.info("Updated collection version is %s", new_version)
+
+    return update_galaxy(path, new_version)
+
+
 def main() -> None:
     """Run the script."""
     parser = ArgumentParser()
@@ -126,19 +211,16 @@ def main() -> None:
         required=True,
     )
 
+    timing.add_arguments(parser)
+
     if argcomplete:
         argcomplete.autocomplete(parser)
 
     args = parser.parse_args()
     path = Path(args.path).absolute()
 
-    version = get_last_version(path)
-    logging.info("Detected collection version is %s", version)
-
-    new_version = update_version(path, version)
-    logging.info("Updated collection version is %s", new_version)
-
-    changed = update_galaxy(path, new_version)
+    with timing.instrument(args, "version"):
+        changed = process(path)
     sys.exit(int(changed))
 
 
@@ -0,0 +1,81 @@
+"""List the plugin files of a collection with a single walk of its plugins directory."""
+import os
+
+
+class CollectionIndex:
+    """The plugin files of a collection, by plugin type.
+
+    The files of each plugin type are kept in directory order, with their size and
+    modification time, so the commands sharing the index don't list or stat the
+    plugins directory again.
+    """
+
+    def __init__(self, path):
+        """Walk the plugins directory of a collection.
+
+        :param path: The path to the collection
+        """
+        self.path = os.fspath(path)
+        self.files = {}
+        try:
+            with os.scandir(os.path.join(self.path, "plugins")) as subdirs:
+                for subdir in subdirs:
+                    if subdir.is_dir():
+                        self.files[subdir.name] = self._scan(subdir.path)
+        except FileNotFoundError:
+            pass
+        self.actions = {
+            name[: -len(".py")] for name in self.files.get("action", {}) if name.endswith(".py")
+        }
+
+    @staticmethod
+    def _scan(dirpath):
+        """List the files in a plugin directory.
+
+        :param dirpath: The full path to the plugin directory
+        :return: The size and modification time of each file, in directory order
+        """
+        files = {}
+        with os.scandir(dirpath) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return files
+
+    def plugin_types(self):
+        """List the plugin types with a directory in the collection.
+
+        :return: The plugin types, in directory order
+        """
+        return list(self.files)
+
+    def names(self, plugin_type, suffix=".py"):
+        """List the files of a plugin type.
+
+        :param plugin_type: The plugin type, the name of its directory under plugins
+        :param suffix: Only list the files ending with it
+        :return: The file names in directory order, or None if the directory doesn't exist
+        """
+        files = self.files.get(plugin_type)
+        if files is None:
+            return None
+        return [name for name in files if name.endswith(suffix)]
+
+    def stat(self, plugin_type, name):
+        """Get the size and modification time of a plugin file.
+
+        :param plugin_type: The plugin type
+        :param name: The file name
+        :return: The size in bytes and the modification time in nanoseconds,
+            or None if the file isn't in the index
+        """
+        return self.files.get(plugin_type, {}).get(name)
+
+    def has_action(self, name):
+        """Determine if the collection has an action plugin.
+
+        :param name: The name of the action plugin
+        :return: True if plugins/action/<name>.py exists
+        """
+        return name in self.actions
@@ -0,0 +1,115 @@
+"""Keep the plugin files of a collection in memory for the stages of a single run."""
+import ast
+import hashlib
+import os
+
+from collection_prep.collection_index import CollectionIndex
+
+
+class CollectionModel:
+    """The plugin files of a collection, read and parsed once and shared by each stage.
+
+    A file is read the first time a stage asks for it, and its documentation parsed
+    the first time a stage asks for that. A stage that rewrites a file hands the new
+    contents back with :meth:`update`, so the later stages don't read it again.
+    """
+
+    def __init__(self, collection, path):
+        """Walk the plugins directory of a collection.
+
+        :param collection: The collection name
+        :param path: The path to the collection
+        """
+        self.collection = collection
+        self.path = os.fspath(path)
+        self.index = CollectionIndex(self.path)
+        self._sources = {}
+        self._docstrings = {}
+
+    def source(self, fullpath):
+        """Get the contents of a plugin file.
+
+        :param fullpath: The full path to the file
+        :return: The contents of the file, with its line endings
+        """
+        fullpath = os.fspath(fullpath)
+        if fullpath not in self._sources:
+            with open(fullpath, encoding="utf8", newline="") as file_obj:
+                self._sources[fullpath] = file_obj.read()
+        return self._sources[fullpath]
+
+    def digest(self, fullpath):
+        """Compute the content hash of a plugin file, as utils.file_digest does.
+
+        :param fullpath: The full path to the file
+        :return: The hex encoded sha256 of the file contents
+        """
+        return hashlib.sha256(self.source(fullpath).encode("utf8")).hexdigest()
+
+    def update(self, fullpath, contents):
+        """Record the contents a stage wrote to a plugin file.
+
+        :param fullpath: The full path to the file
+        :param contents: The new contents of the file
+        """
+        fullpath = os.fspath(fullpath)
+        self._sources[fullpath] = contents
+        self._docstrings.pop(fullpath, None)
+
+    def refresh(self):
+        """Walk the plugins directory again, once a stage has written to it."""
+        self.index = CollectionIndex(self.path)
+
+    def parsed(self, fullpath):
+        """Get the documentation of a plugin file if a stage already parsed it.
+
+        :param fullpath: The full path to the file
+        :return: The documentation, or None if it wasn't parsed yet
+        """
+        return self._docstrings.get(os.fspath(fullpath))
+
+    def docstring(self, fullpath):
+        """Parse the documentation of a plugin file.
+
+        The result is the one ansible-core's plugin_docs.read_docstring gives for a
+        python file: the top-level assignments are found with ast, DOCUMENTATION and
+        RETURN are loaded with the AnsibleLoader and EXAMPLES is kept as text.
+        It is shared, the stages must copy it before making changes.
+
+        :param fullpath: The full path to the file
+        :return: The doc, plainexamples, returndocs, metadata and seealso of the plugin
+        :raises AnsibleParserError: If the documentation can't be parsed
+        """
+        # pylint: disable-msg=import-outside-toplevel
+        from ansible.errors import AnsibleParserError
+        from ansible.parsing.plugin_docs import string_to_vars
+        from ansible.parsing.yaml.loader import AnsibleLoader
+
+        fullpath = os.fspath(fullpath)
+        if fullpath in self._docstrings:
+            return self._docstrings[fullpath]
+
+        data = {key: None for key in string_to_vars.values()}
+        try:
+            module = ast.parse(self.source(fullpath))
+            for node in module.body:
+                if not isinstance(node, ast.Assign):
+                    continue
+                for target in node.targets:
+                    if not isinstance(target, ast.Name) or target.id not in string_to_vars:
+                        continue
+                    key = string_to_vars[target.id]
+                    if isinstance(node.value, ast.Dict):
+                        data[key] = ast.literal_eval(node.value)
+                    elif target.id == "EXAMPLES":
+                        data[key] = str(node.value.value)
+                    else:
+                        data[key] = AnsibleLoader(
+                            node.value.value, file_name=fullpath
+                        ).get_single_data()
+        except Exception as exc:
+            msg = f"Unable to parse documentation in python file '{fullpath}': {exc}"
+            raise AnsibleParserError(msg, orig_exc=exc) from exc
+        data["seealso"] = None
+        self._docstrings[fullpath] = data
+        return data
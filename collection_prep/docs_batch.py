@@ -0,0 +1,295 @@
+"""Set up collections for their doc fragments and document them in batches and worker pools."""
+# ansible-core and yaml are imported where they are used, like in the console scripts
+# pylint: disable-msg=import-outside-toplevel
+import logging
+import shutil
+import sys
+import tempfile
+
+from contextlib import ExitStack
+from contextlib import contextmanager
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Optional
+
+from collection_prep import timing
+from collection_prep.fragment_resolver import FragmentResolver
+
+
+def _init_worker(collection_paths, resolver):
+    """Prepare a worker process to find doc fragments.
+
+    :param collection_paths: The collection paths configured in the parent process
+    :param resolver: The doc fragment resolver installed in the parent process
+    """
+    from ansible.utils.collection_loader._collection_finder import _AnsibleCollectionFinder
+
+    _AnsibleCollectionFinder(  # pylint: disable-msg=protected-access
+        paths=collection_paths
+    )._install()
+    resolver.install()
+
+
+@contextmanager
+def worker_pool(jobs, pool="process"):
+    """Start a pool of workers to extract and render plugins.
+
+    Worker processes find doc fragments with the collection paths and the resolver
+    configured when the pool starts.
+
+    :param jobs: The number of workers
+    :param pool: The kind of worker pool, process or thread
+    :yield: The executor
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures import ThreadPoolExecutor
+
+    from ansible.utils.collection_loader import AnsibleCollectionConfig
+
+    if pool == "thread":
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            yield executor
+    else:
+        paths = AnsibleCollectionConfig.collection_paths  # pylint: disable-msg=no-member
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_init_worker,
+            initargs=(paths, FragmentResolver.installed()),
+        ) as executor:
+            yield executor
+
+
+def run_plugins(
+    run, tasks, jobs, pool="process", executor=None, stats=None
+):  # pylint: disable-msg=too-many-arguments,too-many-positional-arguments
+    """Run a plugin function for each task, in a worker pool if requested.
+
+    :param run: The function run for each plugin, add_docs.timed_process_plugin, which
+        returns its result, its timing records and its doc fragment cache hits and misses
+    :param tasks: The arguments to the function for each plugin
+    :param jobs: The number of workers used to extract and render plugins
+    :param pool: The kind of worker pool, process or thread
+    :param executor: A worker pool shared with other collections, started here if not given
+    :param stats: Counts the doc fragment cache hits and misses of every plugin, if given
+    :return: The results of the function in task order
+    """
+    if jobs > 1 and len(tasks) > 1:
+        logging.info("Processing %s plugins with %s %s workers", len(tasks), jobs, pool)
+        with ExitStack() as stack:
+            if executor is None:
+                executor = stack.enter_context(worker_pool(jobs, pool))
+            # Thread pools ignore the chunk size
+            timed = list(executor.map(run, *zip(*tasks), chunksize=4))
+    else:
+        timed = [run(*task) for task in tasks]
+    results = []
+    for result, records, plugin_stats in timed:
+        timing.extend(records)
+        if stats is not None:
+            stats.update(plugin_stats)
+        results.append(result)
+    return results
+
+
+def load_galaxy(path):
+    """Load collection details from the galaxy.yml file in the collection.
+
+    :param path: The path the collection
+    :return: The collection name and gh url
+    """
+    import yaml
+
+    try:
+        with open(Path(path, "galaxy.yml"), encoding="utf8") as stream:
+            try:
+                return yaml.safe_load(stream)
+            except yaml.YAMLError:
+                logging.error("Unable to parse galaxy.yml in %s", path)
+                sys.exit(1)
+    except FileNotFoundError:
+        logging.error("Unable to find galaxy.yml in %s", path)
+        sys.exit(1)
+
+
+def link_collection(path: Path, galaxy: dict, collection_root: Optional[Path] = None):
+    """Link the provided collection into the Ansible default collection path.
+
+    :param path: A path
+    :param galaxy: The galaxy.yml contents
+    :param collection_root: The root collections path
+    """
+    if collection_root is None:
+        collection_root = Path(Path.home(), ".ansible/collections/ansible_collections")
+
+    namespace_directory = Path(collection_root, galaxy["namespace"])
+    collection_directory = Path(namespace_directory, galaxy["name"])
+
+    logging.info("Linking collection to collection path %s", collection_root)
+    logging.info("This is required for the Ansible fragment loader to find doc fragments")
+
+    if collection_directory.exists():
+        logging.info("Attempting to remove existing %s", collection_directory)
+
+        if collection_directory.is_symlink():
+            logging.info("Unlinking: %s", collection_directory)
+            collection_directory.unlink()
+        else:
+            logging.info("Deleting: %s", collection_directory)
+            shutil.rmtree(collection_directory)
+
+    logging.info("Creating namespace directory %s", namespace_directory)
+    namespace_directory.mkdir(parents=True, exist_ok=True)
+
+    logging.info("Linking collection %s -> %s", path, collection_directory)
+    collection_directory.symlink_to(path)
+
+
+def add_collection(path: Path, galaxy: dict):
+    """Tell ansible-core and the doc fragment resolver where to find local doc_fragments.
+
+    :param path: The collections path
+    :param galaxy: The contents of galaxy.yml
+    """
+    add_collections([(path, galaxy)])
+
+
+def add_collections(collections: list):
+    """Tell ansible-core and the doc fragment resolver where to find local doc_fragments.
+
+    The doc fragments of the collections, and of collections next to them, are read
+    in place by the resolver. For the doc fragments left to ansible-core, collections
+    in an ansible_collections directory are added to the collection finder, and the
+    others linked into a temporary one, which lasts as long as the resolver.
+
+    :param collections: The path and the contents of galaxy.yml of each collection
+    """
+    from ansible.utils.collection_loader import AnsibleCollectionConfig
+    from ansible.utils.collection_loader._collection_finder import _AnsibleCollectionFinder
+
+    collections_paths = []
+    tempdir = None
+    for path, galaxy in collections:
+        collections_path = None
+        try:
+            collections_path = path.parents[1]
+        except IndexError:
+            pass
+
+        # Check that parent dir is named ansible_collections
+        if collections_path and collections_path.name != "ansible_collections":
+            logging.info("%s doesn't look enough like a collection", collections_path)
+            collections_path = None
+
+        if collections_path is None:
+            if tempdir is None:
+                tempdir = tempfile.TemporaryDirectory()  # pylint: disable-msg=consider-using-with
+                logging.info("Temporary collection path %s created", tempdir.name)
+            collections_path = Path(tempdir.name, "ansible_collections")
+            link_collection(path, galaxy, collection_root=collections_path)
+        if collections_path not in collections_paths:
+            logging.info("Collection path is %s", collections_path)
+            collections_paths.append(collections_path)
+
+    # Tell ansible about the paths
+    _AnsibleCollectionFinder(  # pylint: disable-msg=protected-access
+        paths=[*collections_paths, "~/.ansible/collections"]
+    )._install()
+    FragmentResolver(
+        collections={
+            f"{galaxy['namespace']}.{galaxy['name']}": path for path, galaxy in collections
+        },
+        roots=[
+            Path(collections_path, "ansible_collections")
+            # pylint: disable-msg=no-member
+            for collections_path in AnsibleCollectionConfig.collection_paths
+        ],
+        tempdir=tempdir,
+    ).install()
+
+
+def find_collections(root):
+    """Find the collections in an ansible_collections tree.
+
+    :param root: The ansible_collections directory, or the directory holding it
+    :return: The path to each collection with a galaxy.yml, in name order
+    """
+    root = Path(root).absolute()
+    if root.name != "ansible_collections" and Path(root, "ansible_collections").is_dir():
+        root = Path(root, "ansible_collections")
+    return sorted(galaxy.parent for galaxy in root.glob("*/*/galaxy.yml"))
+
+
+def load_collections(paths):
+    """Load the galaxy.yml of each collection of a batch.
+
+    :param paths: The path to each collection
+    :return: The path and the contents of galaxy.yml of each collection, and the error
+        of each collection that can't be documented, by path
+    """
+    collections = []
+    failed = {}
+    seen = {}
+    for path in paths:
+        path = Path(path).absolute()
+        try:
+            galaxy = load_galaxy(path=path)
+        except SystemExit:
+            # load_galaxy logged why
+            failed[str(path)] = "Unable to load galaxy.yml"
+            continue
+        collection = f"{galaxy['namespace']}.{galaxy['name']}"
+        if collection in seen:
+            failed[str(path)] = f"{collection} is also in {seen[collection]}"
+            continue
+        seen[collection] = path
+        collections.append((path, galaxy))
+    return collections, failed
+
+
+def generate_all(paths, document, jobs=1, pool="process", link=False):
+    """Generate the plugin docs of several collections in one run.
+
+    The doc fragments of every collection are found with a single collection finder,
+    and the workers and their templates are shared by every collection. A collection
+    that fails doesn't stop the others.
+
+    :param paths: The path to each collection
+    :param document: The function documenting a collection, add_docs.document_collection,
+        called with its name, path, galaxy.yml contents and the shared worker pool
+    :param jobs: The number of workers used to extract and render plugins
+    :param pool: The kind of worker pool, process or thread
+    :param link: Link the collections in ~/.ansible/collections
+    :return: The error of each collection that failed, by path
+    """
+    collections, failed = load_collections(paths)
+    with timing.phase("link"):
+        if link:
+            for path, galaxy in collections:
+                link_collection(path, galaxy)
+        add_collections(collections)
+
+    documented = 0
+    with worker_pool(jobs, pool) if jobs > 1 else nullcontext() as executor:
+        for path, galaxy in collections:
+            collection = f"{galaxy['namespace']}.{galaxy['name']}"
+            logging.info("Generating the docs of %s in %s", collection, path)
+            try:
+                content = document(collection, path, galaxy, executor)
+            except SystemExit:
+                # The README helpers logged why
+                failed[str(path)] = "Unable to update README.md"
+                continue
+            except Exception as exc:  # pylint: disable-msg=broad-exception-caught
+                logging.exception("Failed to generate the docs of %s", collection)
+                failed[str(path)] = f"{type(exc).__name__}: {exc}"
+                continue
+            documented += 1
+            logging.info(
+                "Documented %s plugins of %s",
+                sum(len(plugins) for plugins in content.values()),
+                collection,
+            )
+    logging.info("Generated the docs of %s of %s collections", documented, len(paths))
+    for path, error in failed.items():
+        logging.error("Failed %s: %s", path, error)
+    return failed
@@ -0,0 +1,273 @@
+"""Plan which plugin docs of a collection to regenerate, from the manifest and the cache."""
+import json
+import logging
+
+from pathlib import Path
+
+from collection_prep.cache import code_version
+from collection_prep.cache import make_key
+from collection_prep.collection_index import CollectionIndex
+from collection_prep.fragment_resolver import FragmentResolver
+from collection_prep.utils import file_digest
+from collection_prep.utils import write_if_changed
+
+
+IGNORE_FILES = ["__init__.py"]
+SUBDIRS = (
+    "become",
+    "cliconf",
+    "connection",
+    "filter",
+    "httpapi",
+    "inventory",
+    "lookup",
+    "netconf",
+    "modules",
+    "test",
+    "validate",
+)
+# The template add_docs renders every plugin with
+TEMPLATE = Path(__file__).parent / "cmd" / "plugin.rst.j2"
+MANIFEST_NAME = ".collection_prep_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def manifest_inputs(collection, engine="ansible"):
+    """Describe the inputs shared by every plugin in the manifest.
+
+    :param collection: The collection name
+    :param engine: The engine reading the documentation, one of add_docs.ENGINES
+    :return: The inputs that invalidate the whole manifest when changed
+    """
+    # pylint: disable-msg=import-outside-toplevel
+    from ansible.release import __version__ as ansible_version
+
+    return {
+        "version": MANIFEST_VERSION,
+        "collection": collection,
+        "ansible": ansible_version,
+        "template": file_digest(TEMPLATE),
+        "engine": engine,
+        # The filters, the rendering and the README update change with collection_prep
+        "code": code_version(),
+    }
+
+
+def load_manifest(docs_path, inputs):
+    """Load the manifest written by a previous run.
+
+    :param docs_path: The path to the docs directory
+    :param inputs: The shared inputs for this run
+    :return: The manifest of the previous run, or None if it can't be reused
+    """
+    try:
+        with open(Path(docs_path, MANIFEST_NAME), encoding="utf8") as manifest_file:
+            manifest = json.load(manifest_file)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        logging.warning("Unable to parse %s, regenerating all plugin docs", MANIFEST_NAME)
+        return None
+    if manifest.get("inputs") != inputs:
+        logging.info("Template, ansible-core or collection changed, regenerating all plugin docs")
+        return None
+    return manifest
+
+
+def save_manifest(docs_path, inputs, entries):
+    """Save the manifest for the next run.
+
+    :param docs_path: The path to the docs directory
+    :param inputs: The shared inputs for this run
+    :param entries: The manifest entry for each plugin file
+    """
+    manifest = {"inputs": inputs, "plugins": entries, "fragments": fragment_index(entries)}
+    write_if_changed(Path(docs_path, MANIFEST_NAME), json.dumps(manifest, indent=2) + "\n")
+
+
+def fragment_index(entries):
+    """Build the reverse index from each doc fragment to the plugins that extend it.
+
+    :param entries: The manifest entry for each plugin file
+    :return: The plugin files extending each doc fragment
+    """
+    index = {}
+    for relpath, entry in entries.items():
+        for name in entry["fragments"]:
+            index.setdefault(name, []).append(relpath)
+    return {name: sorted(index[name]) for name in sorted(index)}
+
+
+def list_plugins(path, index=None):
+    """List the plugin files in each subdirectory.
+
+    :param path: The path to the collection
+    :param index: The plugin files of the collection, listed again if not given
+    :return: The plugin files relative to the collection for each existing subdirectory
+    """
+    index = index or CollectionIndex(path)
+    listing = {}
+    for subdir in SUBDIRS:
+        filenames = index.names(subdir)
+        if filenames is not None:
+            logging.info("Process content in %s", Path(path, "plugins", subdir))
+            listing[subdir] = [
+                f"plugins/{subdir}/{filename}"
+                for filename in filenames
+                if filename not in IGNORE_FILES
+            ]
+    return listing
+
+
+def changed_plugins(collection, path, index, changed):
+    """Find the plugins affected by a set of changed files.
+
+    :param collection: The collection name
+    :param path: The path to the collection
+    :param index: The plugins extending each doc fragment
+    :param changed: The changed files
+    :return: The changed plugins and the plugins extending a changed doc fragment
+    """
+    affected = set()
+    for filename in changed:
+        try:
+            relpath = Path(filename).absolute().relative_to(path)
+        except ValueError:
+            continue
+        parts = relpath.parts
+        if len(parts) < 3 or parts[0] != "plugins" or relpath.suffix != ".py":
+            continue
+        if parts[1] == "doc_fragments":
+            fragment = ".".join((collection,) + parts[2:-1] + (relpath.stem,))
+            affected.update(index.get(fragment, []))
+        elif parts[1] in SUBDIRS and len(parts) == 3 and parts[2] not in IGNORE_FILES:
+            affected.add(relpath.as_posix())
+    return affected
+
+
+def affected_plugins(collection, path, changed, engine="ansible"):
+    """Compute the minimum set of plugins to regenerate for a set of changed files.
+
+    A changed plugin is regenerated along with every plugin extending a changed
+    doc fragment of this collection. Without a usable manifest every plugin is affected.
+
+    :param collection: The collection name
+    :param path: The path to the collection
+    :param changed: The changed files
+    :param engine: The engine reading the documentation, one of add_docs.ENGINES
+    :return: The plugin files to regenerate, relative to the collection
+    """
+    manifest = load_manifest(Path(path, "docs"), manifest_inputs(collection, engine))
+    if manifest is None:
+        return {relpath for relpaths in list_plugins(path).values() for relpath in relpaths}
+    return changed_plugins(collection, path, manifest["fragments"], changed)
+
+
+def fragment_digest(name, digests):
+    """Compute the content hash of a doc fragment by name.
+
+    :param name: The name of the doc fragment
+    :param digests: Previously computed digests for this run
+    :return: The hex encoded sha256 of the doc fragment, or None if it is missing
+    """
+    if name not in digests:
+        fragment_path = FragmentResolver.installed().find_plugin(name)
+        digests[name] = file_digest(fragment_path) if fragment_path else None
+    return digests[name]
+
+
+def entry_is_current(entry, source, docs_path, digests):
+    """Determine if a manifest entry still matches the plugin and its fragments.
+
+    :param entry: The manifest entry from the previous run
+    :param source: The content hash of the plugin file
+    :param docs_path: The path to the docs directory
+    :param digests: Previously computed fragment digests for this run
+    :return: True if the plugin does not need to be processed again
+    """
+    if entry is None or entry["source"] != source:
+        return False
+    if entry["rst"] and not Path(docs_path, entry["rst"]).is_file():
+        return False
+    return all(
+        fragment_digest(name, digests) == digest for name, digest in entry["fragments"].items()
+    )
+
+
+def docs_key(source, inputs):
+    """Build the cache key of the documentation of a plugin.
+
+    :param source: The content hash of the plugin file
+    :param inputs: The inputs shared by every plugin, see manifest_inputs
+    :return: The key
+    """
+    return make_key(source, inputs["ansible"], inputs["engine"])
+
+
+def read_cached(tasks, sources, store, inputs):
+    """Take the documentation of each plugin to process from the cache, if still valid.
+
+    A cached documentation is valid while the plugin file, the content of every doc
+    fragment it used, ansible-core, the engine and collection_prep are unchanged.
+
+    :param tasks: The arguments to process_plugin for each plugin
+    :param sources: The plugin file and its content hash for each task
+    :param store: The cache shared with the other commands and runs
+    :param inputs: The inputs shared by every plugin, see manifest_inputs
+    :return: The tasks, with the cached documentation of each plugin found
+    """
+    digests = {}
+    read = []
+    for task, (_relpath, source) in zip(tasks, sources):
+        cached = store.get("docs", docs_key(source, inputs))
+        if cached is not None and all(
+            fragment_digest(name, digests) == digest for name, digest in cached["fragments"].items()
+        ):
+            task = (*task[:3], None, cached)
+        read.append(task)
+    hits = sum(1 for task in read if task[4] is not None)
+    if hits:
+        logging.info("Read the docs of %s of %s plugins from the cache", hits, len(read))
+    return read
+
+
+def plan_plugins(
+    collection, path, previous, affected=None, model=None
+):  # pylint: disable-msg=too-many-locals
+    """List the plugins in each subdirectory and find those that need processing.
+
+    :param collection: The collection name
+    :param path: The path to the collection
+    :param previous: The manifest entries from the previous run
+    :param affected: The only plugins known to have changed, or None to check every plugin
+    :param model: The plugin files of the collection shared with the other stages, if any
+    :return: The plugin files per subdirectory, the reusable manifest entries,
+        the process_plugin tasks and the plugin file and content hash for each task
+    """
+    docs_path = Path(path, "docs")
+    listing = list_plugins(path, model.index if model else None)
+    entries = {}
+    digests = {}
+    tasks = []
+    sources = []
+
+    for subdir, relpaths in listing.items():
+        for relpath in relpaths:
+            entry = previous.get(relpath)
+            if (
+                affected is not None
+                and relpath not in affected
+                and entry is not None
+                and (not entry["rst"] or Path(docs_path, entry["rst"]).is_file())
+            ):
+                entries[relpath] = entry
+                continue
+            fullpath = Path(path, relpath)
+            source = model.digest(fullpath) if model else file_digest(fullpath)
+            if entry_is_current(entry, source, docs_path, digests):
+                entries[relpath] = entry
+            else:
+                data = model.parsed(fullpath) if model else None
+                tasks.append((collection, fullpath, subdir, data, None))
+                sources.append((relpath, source))
+    return listing, entries, tasks, sources
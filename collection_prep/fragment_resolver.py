@@ -0,0 +1,341 @@
+"""Find doc fragments in collection checkouts, without linking them into a collections path."""
+import ast
+import os
+
+from collections import Counter
+from pathlib import Path
+
+from collection_prep.lite_extractor import load_yaml
+from collection_prep.utils import file_digest
+
+
+class Fragment:  # pylint: disable-msg=too-few-public-methods
+    """A doc fragment read from its file, in place of the class ansible-core would import."""
+
+    def __init__(self, name, path, variables):
+        """Initialize the fragment.
+
+        :param name: The fully qualified name of the doc fragment
+        :param path: The path to the doc fragment file
+        :param variables: The documentation strings of the doc fragment, by name
+        """
+        self.ansible_name = name
+        self._original_path = os.fspath(path)
+        for variable, value in variables.items():
+            setattr(self, variable, value)
+
+
+def read_fragment(path):
+    """Read the documentation strings of a doc fragment file without importing it.
+
+    :param path: The path to the doc fragment file
+    :return: The strings assigned in its ModuleDocFragment class, by name, or None if
+        the class is missing, inherits from another or assigns anything but a string
+    """
+    module = ast.parse(Path(path).read_text(encoding="utf8"))
+    for node in module.body:
+        if not isinstance(node, ast.ClassDef) or node.name != "ModuleDocFragment":
+            continue
+        if any(not isinstance(base, ast.Name) or base.id != "object" for base in node.bases):
+            return None
+        variables = {}
+        for item in node.body:
+            if not isinstance(item, ast.Assign):
+                continue
+            if not isinstance(item.value, ast.Constant) or not isinstance(item.value.value, str):
+                return None
+            for target in item.targets:
+                if isinstance(target, ast.Name):
+                    variables[target.id] = item.value.value
+        return variables
+    return None
+
+
+def copy_document(value):
+    """Copy a parsed YAML document, sharing its scalars, which can't be changed.
+
+    This is much faster than copy.deepcopy, most of all on ansible-core's YAML types.
+
+    :param value: The document
+    :return: The copy, with plain dicts, lists and sets
+    """
+    if isinstance(value, dict):
+        return {key: copy_document(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [copy_document(item) for item in value]
+    if isinstance(value, set):
+        return set(value)
+    return value
+
+
+class FragmentResolver:  # pylint: disable-msg=too-many-instance-attributes
+    """Load doc fragments the way ansible-core's fragment loader does, from known paths.
+
+    The doc fragments of a collection are read from the collection given by path, from
+    a sibling checkout named namespace.name next to one, or from an ansible_collections
+    directory, in that order. Redirects in meta/runtime.yml are followed. Anything else,
+    like the ansible.builtin doc fragments, other routing entries and doc fragments that
+    are not plain strings, is left to ansible-core, which needs a collection finder
+    installed to find them.
+
+    Each doc fragment is located, read and hashed once per process, and parsed once for
+    the lite engine, as most plugins of a collection extend the same few doc fragments.
+    A resolver can be pickled, to be installed in worker processes, which load their own.
+    """
+
+    current = None
+
+    def __init__(self, collections=None, roots=None, fallback=None, tempdir=None):
+        """Initialize the resolver.
+
+        :param collections: The path to each collection by name
+        :param roots: The ansible_collections directories to look for other collections in
+        :param fallback: The loader for the doc fragments not found, ansible-core's if not given
+        :param tempdir: A temporary collections path for the fallback loader, removed along
+            with the resolver
+        """
+        self.collections = {name: Path(path) for name, path in (collections or {}).items()}
+        self.checkouts = list(dict.fromkeys(path.parent for path in self.collections.values()))
+        self.roots = [Path(root) for root in roots or ()]
+        self.fallback = fallback
+        self.tempdir = tempdir
+        self._located = {}
+        self._routed = {}
+        self._fragments = {}
+        self._digests = {}
+        self._parsed = {}
+
+    def __getstate__(self):
+        """Leave the fallback loader and the loaded doc fragments out when pickled.
+
+        The temporary collections path stays owned by the process that created it.
+
+        :return: The state of the resolver
+        """
+        state = self.__dict__.copy()
+        state.update(fallback=None, tempdir=None, _fragments={}, _digests={}, _parsed={})
+        return state
+
+    def install(self):
+        """Make this the resolver used to load doc fragments in this process."""
+        FragmentResolver.current = self
+
+    @classmethod
+    def installed(cls):
+        """Get the resolver used to load doc fragments in this process.
+
+        :return: The installed resolver, or one leaving every doc fragment to ansible-core
+        """
+        if cls.current is None:
+            cls.current = cls()
+        return cls.current
+
+    def _fallback(self):
+        """Get the loader for the doc fragments not found.
+
+        :return: The fallback loader
+        """
+        if self.fallback is None:
+            from ansible.plugins.loader import (  # pylint: disable-msg=import-outside-toplevel
+                fragment_loader,
+            )
+
+            self.fallback = fragment_loader
+        return self.fallback
+
+    def locate(self, collection):
+        """Find a collection by name.
+
+        :param collection: The collection name
+        :return: The path to the collection, or None if it is not found
+        """
+        if collection not in self._located:
+            namespace, name = collection.split(".")
+            candidates = [
+                *(Path(checkout, collection) for checkout in self.checkouts),
+                *(Path(root, namespace, name) for root in self.roots),
+            ]
+            # Installed collections have a MANIFEST.json instead of a galaxy.yml
+            self._located[collection] = self.collections.get(collection) or next(
+                (
+                    path
+                    for path in candidates
+                    if Path(path, "galaxy.yml").is_file() or Path(path, "MANIFEST.json").is_file()
+                ),
+                None,
+            )
+        return self._located[collection]
+
+    def routed(self, collection, path):
+        """Read how meta/runtime.yml of a collection routes doc fragments.
+
+        :param collection: The collection name
+        :param path: The path to the collection
+        :return: The routing entry of each doc fragment with one, by name
+        """
+        if collection not in self._routed:
+            import yaml  # pylint: disable-msg=import-outside-toplevel
+
+            try:
+                with open(Path(path, "meta", "runtime.yml"), encoding="utf8") as file_obj:
+                    runtime = yaml.safe_load(file_obj) or {}
+            except (OSError, yaml.YAMLError):
+                runtime = {}
+            routing = (runtime.get("plugin_routing") or {}).get("doc_fragments") or {}
+            self._routed[collection] = routing if isinstance(routing, dict) else {}
+        return self._routed[collection]
+
+    def resolve(self, name, seen=()):
+        """Find the file of a doc fragment of a collection this resolver knows.
+
+        A redirect is followed when it is all the routing entry holds, besides a
+        deprecation, the way ansible-core's plugin loader follows it.
+
+        :param name: The fully qualified name of the doc fragment
+        :param seen: The names redirected to this one, to stop at a redirect loop
+        :return: The fully qualified name the doc fragment resolves to, and the path to its
+            file, or None if it doesn't exist, or False if it is left to the fallback loader
+        """
+        parts = name.split(".")
+        if len(parts) < 3 or parts[:2] == ["ansible", "builtin"]:
+            return name, False
+        collection = ".".join(parts[:2])
+        path = self.locate(collection)
+        if path is None:
+            return name, False
+        routing = self.routed(collection, path).get(".".join(parts[2:]))
+        if routing is not None:
+            redirect = routing.get("redirect") if isinstance(routing, dict) else None
+            if (
+                not isinstance(redirect, str)
+                or set(routing) - {"redirect", "deprecation"}
+                or redirect in seen
+            ):
+                return name, False
+            resolved, filename = self.resolve(redirect, (*seen, name))
+            return (name, False) if filename is False else (resolved, filename)
+        filename = Path(path, "plugins", "doc_fragments", *parts[2:-1], f"{parts[-1]}.py")
+        return name, filename if filename.is_file() else None
+
+    def find(self, name):
+        """Find the file of a doc fragment of a collection this resolver knows.
+
+        :param name: The fully qualified name of the doc fragment
+        :return: The path to the doc fragment file, or None if it doesn't exist, or
+            False if it is left to the fallback loader
+        """
+        return self.resolve(name)[1]
+
+    def loaded(self, name):
+        """Check whether a doc fragment was already loaded.
+
+        :param name: The name of the doc fragment
+        :return: True if the doc fragment, or its absence, is known
+        """
+        return name in self._fragments
+
+    def get(self, name, *args, **kwargs):
+        """Load a doc fragment.
+
+        :param name: The name of the doc fragment
+        :param args: Positional arguments for the fallback loader
+        :param kwargs: Keyword arguments for the fallback loader
+        :return: The doc fragment, or None if it was not found
+        """
+        if name not in self._fragments:
+            resolved, filename = self.resolve(name)
+            variables = read_fragment(filename) if filename else None
+            if filename is False or (filename and variables is None):
+                self._fragments[name] = self._fallback().get(name, *args, **kwargs)
+            else:
+                self._fragments[name] = filename and Fragment(resolved, filename, variables)
+        return self._fragments[name]
+
+    def digest(self, fragment):
+        """Compute the content hash of a loaded doc fragment.
+
+        :param fragment: The doc fragment
+        :return: The hex encoded sha256 of the doc fragment file
+        """
+        path = fragment._original_path  # pylint: disable-msg=protected-access
+        if path not in self._digests:
+            self._digests[path] = file_digest(path)
+        return self._digests[path]
+
+    def parsed(self, text, load):
+        """Check whether the YAML of a doc fragment was already parsed.
+
+        :param text: The YAML of the doc fragment
+        :param load: The function parsing it
+        :return: True if the parsed document is known
+        """
+        return (text, load) in self._parsed
+
+    def parse(self, text, load):
+        """Parse the YAML of a doc fragment.
+
+        The merge changes the document, so every caller gets its own copy.
+
+        :param text: The YAML of the doc fragment
+        :param load: The function parsing it
+        :return: The parsed document
+        """
+        if (text, load) not in self._parsed:
+            self._parsed[text, load] = load(text)
+        return copy_document(self._parsed[text, load])
+
+    def find_plugin(self, name):
+        """Find the file of a doc fragment.
+
+        :param name: The name of the doc fragment
+        :return: The path to the doc fragment file, or None if it was not found
+        """
+        filename = self.find(name)
+        if filename is False:
+            return self._fallback().find_plugin(name)
+        return filename and os.fspath(filename)
+
+
+class FragmentRecorder:
+    """Record the doc fragments a plugin extends while loading them."""
+
+    def __init__(self, resolver, stats=None):
+        """Initialize the recorder.
+
+        :param resolver: The resolver to load doc fragments with, shared by the plugins
+        :param stats: Counts the doc fragment cache hits and misses, if given
+        """
+        self._resolver = resolver
+        self._stats = Counter() if stats is None else stats
+        self.fragments = {}
+
+    def get(self, name, *args, **kwargs):
+        """Load a doc fragment and record its content hash.
+
+        A redirected doc fragment is recorded under the name it was asked for and the
+        name it resolved to, so a change to the file it resolved to is found by name.
+
+        :param name: The name of the doc fragment
+        :param args: Positional arguments for the fragment loader
+        :param kwargs: Keyword arguments for the fragment loader
+        :return: The doc fragment, or None if it was not found
+        """
+        self._stats["load hits" if self._resolver.loaded(name) else "load misses"] += 1
+        fragment = self._resolver.get(name, *args, **kwargs)
+        if fragment is not None:
+            digest = self._resolver.digest(fragment)
+            self.fragments[name] = digest
+            resolved = getattr(fragment, "ansible_name", None)
+            if isinstance(resolved, str) and len(resolved.split(".")) >= 3:
+                self.fragments[resolved] = digest
+        return fragment
+
+    def load(self, text):
+        """Parse the YAML of a doc fragment for the lite engine, once per process.
+
+        :param text: The YAML of the doc fragment
+        :return: A copy of the parsed document
+        """
+        hit = self._resolver.parsed(text, load_yaml)
+        self._stats["parse hits" if hit else "parse misses"] += 1
+        return self._resolver.parse(text, load_yaml)
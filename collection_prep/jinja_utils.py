@@ -1,6 +1,7 @@
 """Utilities for jinja2."""
 import re
 
+from functools import lru_cache
 from html import escape as html_escape
 
 from ansible.module_utils._text import to_text
@@ -8,8 +9,6 @@ from ansible.module_utils.six import string_types
 from jinja2.runtime import Undefined
 
 
-NS_MAP = {}
-
 _ITALIC = re.compile(r"I\(([^)]+)\)")
 _BOLD = re.compile(r"B\(([^)]+)\)")
 _MODULE = re.compile(r"M\(([^)]+)\)")
@@ -17,38 +16,74 @@ _URL = re.compile(r"U\(([^)]+)\)")
 _LINK = re.compile(r"L\(([^)]+), *([^)]+)\)")
 _CONST = re.compile(r"C\(([^)]+)\)")
 _RULER = re.compile(r"HORIZONTALLINE")
+_MACROS = re.compile(
+    r"I\((?P<italic>[^)]+)\)"
+    r"|B\((?P<bold>[^)]+)\)"
+    r"|M\((?P<module>[^)]+)\)"
+    r"|U\((?P<url>[^)]+)\)"
+    r"|L\((?P<link_text>[^)]+), *(?P<link>[^)]+)\)"
+    r"|C\((?P<const>[^)]+)\)"
+    r"|(?P<ruler>HORIZONTALLINE)"
+)
+_JOINS = set("IBMULCH(")
+
+_HTML_FORMATS = {
+    "italic": "<em>{0}</em>",
+    "bold": "<b>{0}</b>",
+    "module": "<span class='module'>{0}</span>",
+    "url": "<a href='{0}'>{0}</a>",
+    "link": "<a href='{1}'>{0}</a>",
+    "const": "<code>{0}</code>",
+    "ruler": "<hr/>",
+}
+_RST_FORMATS = {
+    "italic": "*{0}*",
+    "bold": "**{0}**",
+    "module": ":ref:`{0} <{0}_module>`",
+    "url": "{0}",
+    "link": "`{0} <{1}>`_",
+    "const": "``{0}``",
+    "ruler": "------------",
+}
+
+MARKUP_CACHE_SIZE = 4096
+
+
+class KludgeNamespace:
+    """Values saved while rendering a template, for later use in the same render.
+
+    A new namespace is passed to each render, so renders can run concurrently.
+    """
 
+    def __init__(self):
+        """Initialize an empty namespace."""
+        self._values = {}
 
-def to_kludge_ns(key, value):
-    """Save a value for later use.
+    def set(self, key, value):
+        """Save a value for later use.
 
-    :param key: The key to store under
-    :param value: The value to store
-    :return: An empty string to not confuse jinja
-    """
-    NS_MAP[key] = value
-    return ""
+        :param key: The key to store under
+        :param value: The value to store
+        :return: An empty string to not confuse jinja
+        """
+        self._values[key] = value
+        return ""
 
+    def get(self, key):
+        """Recall a value stored with set.
 
-def from_kludge_ns(key):
-    """Recall a value stored with to_kludge_ns.
+        :param key: The key to look for
+        :return: The value stored under that key
+        """
+        return self._values[key]
 
-    :param key: The key to look for
-    :return: The value stored under that key
-    """
-    return NS_MAP[key]
 
+def _html_ify_chain(text):
+    """Convert symbols to HTML with one substitution per macro.
 
-def html_ify(text):
-    """Convert symbols like I(this is in italics) to valid HTML.
-
-    :param text: The text to transform
+    :param text: The HTML escaped text to transform
     :return: An HTML string of the formatted text
     """
-    if not isinstance(text, string_types):
-        text = to_text(text)
-
-    text = html_escape(text)
     text = _ITALIC.sub(r"<em>\1</em>", text)
     text = _BOLD.sub(r"<b>\1</b>", text)
     text = _MODULE.sub(r"<span class='module'>\1</span>", text)
@@ -56,12 +91,11 @@ def html_ify(text):
     text = _LINK.sub(r"<a href='\2'>\1</a>", text)
     text = _CONST.sub(r"<code>\1</code>", text)
     text = _RULER.sub(r"<hr/>", text)
-
-    return text.strip()
+    return text
 
 
-def rst_ify(text):
-    """Convert symbols like I(this is in italics) to valid restructured text.
+def _rst_ify_chain(text):
+    """Convert symbols to restructured text with one substitution per macro.
 
     :param text: The text to transform
     :return: An RST string of the formatted text
@@ -73,10 +107,91 @@ def rst_ify(text):
     text = _URL.sub(r"\1", text)
     text = _CONST.sub(r"``\1``", text)
     text = _RULER.sub(r"------------", text)
-
     return text
 
 
+def _convert(text, formats, chain):
+    """Convert all macros in a single pass over the text.
+
+    The substitution chain applies each macro to the output of the previous one,
+    so nested macros, or a macro whose output forms a new one, can be rewritten
+    more than once. Text where that could happen is handed to the chain instead,
+    which keeps the output identical to it.
+
+    :param text: The text to transform
+    :param formats: The output format for each macro
+    :param chain: The substitution chain to fall back to
+    :return: The formatted text
+    """
+    pieces = []
+    position = 0
+    links = 0
+    for match in _MACROS.finditer(text):
+        kind = match.lastgroup
+        links += kind == "link"
+        args = [arg for arg in match.groups() if arg is not None]
+        if any("(" in arg or "HORIZONTALLINE" in arg for arg in args):
+            return chain(text)
+        output = formats[kind].format(*args)
+        # A macro that outputs its argument unwrapped can join with its neighbours
+        if output[-1:].isalpha() and text[match.end() : match.end() + 1] in _JOINS:
+            return chain(text)
+        if output[:1].isalpha() and text[match.start() - 1 : match.start()].isalpha():
+            return chain(text)
+        pieces.append(text[position : match.start()])
+        pieces.append(output)
+        position = match.end()
+    # A link without a match here can match once a later macro is replaced
+    if pieces and text.count("L(") > links:
+        return chain(text)
+    pieces.append(text[position:])
+    return "".join(pieces)
+
+
+@lru_cache(maxsize=MARKUP_CACHE_SIZE)
+def _html_ify(text):
+    """Convert and cache the HTML for a string.
+
+    :param text: The text to transform
+    :return: An HTML string of the formatted text
+    """
+    return _convert(html_escape(text), _HTML_FORMATS, _html_ify_chain).strip()
+
+
+@lru_cache(maxsize=MARKUP_CACHE_SIZE)
+def _rst_ify(text):
+    """Convert and cache the restructured text for a string.
+
+    :param text: The text to transform
+    :return: An RST string of the formatted text
+    """
+    return _convert(text, _RST_FORMATS, _rst_ify_chain)
+
+
+def html_ify(text):
+    """Convert symbols like I(this is in italics) to valid HTML.
+
+    :param text: The text to transform
+    :return: An HTML string of the formatted text
+    """
+    if not isinstance(text, string_types):
+        text = to_text(text)
+
+    return _html_ify(text)
+
+
+def rst_ify(text):
+    """Convert symbols like I(this is in italics) to valid restructured text.
+
+    :param text: The text to transform
+    :return: An RST string of the formatted text
+    """
+    if not isinstance(text, str):
+        return _rst_ify_chain(text)
+
+    return _rst_ify(text)
+
+
 def documented_type(text):
     """Convert any python type to a type for documentation.
 
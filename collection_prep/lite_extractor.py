@@ -0,0 +1,361 @@
+"""Extract plugin documentation without ansible-core, for the lite engine of the doc generator.
+
+Only the top-level DOCUMENTATION, EXAMPLES, RETURN and ANSIBLE_METADATA assignments are
+read, and doc fragments are merged the way ansible-core's plugin_docs merges them.
+benchmarks/conformance.py checks the results match ansible-core's.
+"""
+import ast
+import io
+import re
+import tokenize
+
+from collections.abc import MutableMapping
+from collections.abc import MutableSequence
+from collections.abc import MutableSet
+from functools import cache
+
+
+# As ansible.parsing.plugin_docs.string_to_vars
+STRING_TO_VARS = {
+    "DOCUMENTATION": "doc",
+    "EXAMPLES": "plainexamples",
+    "RETURN": "returndocs",
+    "ANSIBLE_METADATA": "metadata",
+}
+ASSIGNMENT = re.compile(
+    r"^(" + "|".join(STRING_TO_VARS) + r")[ \t]*=(?!=)", re.MULTILINE  # noqa: ISC003
+)
+# Comments and string literals, so assignments inside them are skipped
+LEXICAL = re.compile(
+    r"#[^\n]*"
+    r"|'''(?:\\.|[^\\])*?'''"
+    r'|"""(?:\\.|[^\\])*?"""'
+    r"|'(?:\\.|[^'\\\n])*'"
+    r'|"(?:\\.|[^"\\\n])*"'
+)
+# The tokens of a value read without parsing the file
+LITERAL_TOKENS = (tokenize.STRING, tokenize.NUMBER, tokenize.OP, tokenize.NAME)
+
+
+class NeedsParse(Exception):
+    """A value can't be read from its tokens alone, the file has to be parsed."""
+
+
+@cache
+def yaml_loader():
+    """Build the YAML loader, reading what ansible-core's AnsibleLoader reads.
+
+    :return: The loader class
+    """
+    # pylint: disable-msg=import-outside-toplevel
+    try:
+        from yaml import CSafeLoader as SafeLoader
+    except ImportError:
+        from yaml import SafeLoader
+
+    class DocLoader(SafeLoader):  # pylint: disable-msg=too-many-ancestors
+        """A safe loader that reads !unsafe strings as plain strings."""
+
+    DocLoader.add_constructor("!unsafe", lambda loader, node: loader.construct_scalar(node))
+    return DocLoader
+
+
+def load_yaml(text):
+    """Load a YAML document.
+
+    :param text: The YAML text
+    :return: The document
+    """
+    import yaml  # pylint: disable-msg=import-outside-toplevel
+
+    return yaml.load(text, Loader=yaml_loader())  # noqa: S506
+
+
+def assign(data, name, value, is_dict):
+    """Record a documentation variable, as ansible-core does.
+
+    :param data: The documentation read so far
+    :param name: The name of the variable
+    :param value: The value assigned
+    :param is_dict: Whether the value is a dict literal
+    """
+    key = STRING_TO_VARS[name]
+    if is_dict:
+        data[key] = value
+    elif name == "EXAMPLES":
+        # Examples are kept as text
+        data[key] = value.decode("utf8") if isinstance(value, bytes) else str(value)
+    else:
+        data[key] = load_yaml(value)
+
+
+def literal_value(text, start):
+    """Read the value of an assignment from its tokens.
+
+    :param text: The contents of the file
+    :param start: The offset of the value
+    :return: The value and whether it is a dict literal
+    :raises NeedsParse: If the value is not a string or a dict literal
+    """
+    tokens = []
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(text[start:]).readline):
+            if token.type in (tokenize.NEWLINE, tokenize.ENDMARKER):
+                break
+            if token.type in (tokenize.NL, tokenize.COMMENT):
+                continue
+            if token.type not in LITERAL_TOKENS:
+                raise NeedsParse
+            tokens.append(token)
+    except (tokenize.TokenError, SyntaxError) as exc:
+        raise NeedsParse from exc
+    if not tokens:
+        raise NeedsParse
+    is_dict = tokens[0].string == "{"
+    if not is_dict and any(
+        token.type != tokenize.STRING and token.string not in ("(", ")") for token in tokens
+    ):
+        raise NeedsParse
+    try:
+        value = ast.literal_eval(" ".join(token.string for token in tokens))
+    except (ValueError, SyntaxError, MemoryError, RecursionError) as exc:
+        raise NeedsParse from exc
+    if not isinstance(value, dict if is_dict else str):
+        raise NeedsParse
+    return value, is_dict
+
+
+def scan_docstring(text):
+    """Read the documentation variables from their tokens, without parsing the file.
+
+    NeedsParse is raised when a value can't be read from its tokens.
+
+    :param text: The contents of the file
+    :return: The documentation variables
+    """
+    data = {key: None for key in STRING_TO_VARS.values()}
+    lexical = LEXICAL.finditer(text)
+    span = next(lexical, None)
+    for match in ASSIGNMENT.finditer(text):
+        while span is not None and span.end() <= match.start():
+            span = next(lexical, None)
+        if span is not None and span.start() < match.start():
+            # In a string or a comment
+            continue
+        value, is_dict = literal_value(text, match.end())
+        assign(data, match.group(1), value, is_dict)
+    return data
+
+
+def parse_docstring(text):
+    """Read the documentation variables by parsing the file, as ansible-core does.
+
+    :param text: The contents of the file
+    :return: The documentation variables
+    """
+    data = {key: None for key in STRING_TO_VARS.values()}
+    for node in ast.parse(text).body:
+        if not isinstance(node, ast.Assign):
+            continue
+        for target in node.targets:
+            if isinstance(target, ast.Name) and target.id in STRING_TO_VARS:
+                if isinstance(node.value, ast.Dict):
+                    assign(data, target.id, ast.literal_eval(node.value), True)
+                else:
+                    assign(data, target.id, node.value.value, False)
+    return data
+
+
+def read_docstring(filename, text=None):
+    """Read the documentation of a plugin file, as ansible-core's read_docstring does.
+
+    The assignments are found with a regular expression and their values read from
+    their tokens. The file is only parsed when a value is not a plain string or dict.
+
+    :param filename: The path to the plugin file
+    :param text: The contents of the file, read from disk if not given
+    :return: The doc, plainexamples, returndocs, metadata and seealso of the plugin
+    :raises ValueError: If the documentation can't be read
+    """
+    try:
+        if text is None:
+            with open(filename, encoding="utf8") as file_obj:
+                text = file_obj.read()
+        try:
+            data = scan_docstring(text)
+        except NeedsParse:
+            data = parse_docstring(text)
+    except Exception as exc:
+        msg = f"Unable to parse documentation in python file '{filename}': {exc}"
+        raise ValueError(msg) from exc
+    data["seealso"] = None
+    return data
+
+
+def merge_fragment(target, source):
+    """Merge a doc fragment into a section of the documentation, as ansible-core does.
+
+    :param target: The section of the documentation
+    :param source: The section of the doc fragment
+    :raises ValueError: If a key of the section can't be extended
+    """
+    for key, value in source.items():
+        if key in target:
+            # assumes both structures have same type
+            if isinstance(target[key], MutableMapping):
+                value.update(target[key])
+            elif isinstance(target[key], MutableSet):
+                value.add(target[key])
+            elif isinstance(target[key], MutableSequence):
+                value = sorted(frozenset(value + target[key]))
+            else:
+                raise ValueError(
+                    f"Attempt to extend a documentation fragment, invalid type for {key}"
+                )
+        target[key] = value
+
+
+def add_collection_to_versions_and_dates(fragment, collection_name, is_module):
+    """Record which collection the versions and dates of a doc fragment refer to.
+
+    :param fragment: The documentation of the doc fragment
+    :param collection_name: The collection of the doc fragment
+    :param is_module: Whether the documentation is a module's
+    """
+
+    def add(options, collection_name_field):
+        if collection_name_field not in options:
+            options[collection_name_field] = collection_name
+
+    def process_deprecation(deprecation, top_level=False):
+        collection_name_field = "removed_from_collection" if top_level else "collection_name"
+        if not isinstance(deprecation, MutableMapping):
+            return
+        if (is_module or top_level) and "removed_in" in deprecation:
+            add(deprecation, collection_name_field)
+        if "removed_at_date" in deprecation:
+            add(deprecation, collection_name_field)
+        if not (is_module or top_level) and "version" in deprecation:
+            add(deprecation, collection_name_field)
+
+    def process_option_specifiers(specifiers):
+        for specifier in specifiers:
+            if not isinstance(specifier, MutableMapping):
+                continue
+            if "version_added" in specifier:
+                add(specifier, "version_added_collection")
+            if isinstance(specifier.get("deprecated"), MutableMapping):
+                process_deprecation(specifier["deprecated"])
+
+    def process_options(options):
+        for option in options.values():
+            if not isinstance(option, MutableMapping):
+                continue
+            if "version_added" in option:
+                add(option, "version_added_collection")
+            if not is_module:
+                for specifiers in ("env", "ini", "vars"):
+                    if isinstance(option.get(specifiers), list):
+                        process_option_specifiers(option[specifiers])
+                if isinstance(option.get("deprecated"), MutableMapping):
+                    process_deprecation(option["deprecated"])
+            if isinstance(option.get("suboptions"), MutableMapping):
+                process_options(option["suboptions"])
+
+    if not fragment:
+        return
+    if "version_added" in fragment:
+        add(fragment, "version_added_collection")
+    if isinstance(fragment.get("deprecated"), MutableMapping):
+        process_deprecation(fragment["deprecated"], top_level=True)
+    if isinstance(fragment.get("options"), MutableMapping):
+        process_options(fragment["options"])
+    if isinstance(fragment.get("attributes"), MutableMapping):
+        for attribute in fragment["attributes"].values():
+            if isinstance(attribute, MutableMapping) and "version_added" in attribute:
+                add(attribute, "version_added_collection")
+
+
+def add_fragments(
+    doc, filename, fragment_loader, is_module=False, load=load_yaml
+):  # pylint: disable-msg=too-many-branches,too-many-locals
+    """Merge the doc fragments a plugin extends into its documentation, as ansible-core does.
+
+    :param doc: The documentation of the plugin
+    :param filename: The path to the plugin file, for error messages
+    :param fragment_loader: The loader to load doc fragments with
+    :param is_module: Whether the plugin is a module
+    :param load: Parse the YAML of a doc fragment, into a document the merge may change
+    :raises ValueError: If a doc fragment is unknown or can't be merged
+    """
+    fragments = doc.pop("extends_documentation_fragment", [])
+    if isinstance(fragments, str):
+        fragments = [fragments]
+
+    unknown_fragments = []
+    # A doc fragment may name a variable other than DOCUMENTATION after a dot, like
+    # collection hosted doc fragments do, so a name is first loaded as given
+    for fragment_slug in fragments:
+        fragment_name = fragment_slug
+        fragment_var = "DOCUMENTATION"
+
+        fragment_class = fragment_loader.get(fragment_name)
+        if fragment_class is None and "." in fragment_slug:
+            fragment_name, fragment_var = fragment_slug.rsplit(".", 1)
+            fragment_var = fragment_var.upper()
+            fragment_class = fragment_loader.get(fragment_name)
+
+        if fragment_class is None:
+            unknown_fragments.append(fragment_slug)
+            continue
+
+        fragment_yaml = getattr(fragment_class, fragment_var, None)
+        if fragment_yaml is None:
+            if fragment_var != "DOCUMENTATION":
+                unknown_fragments.append(fragment_slug)
+                continue
+            fragment_yaml = "{}"
+
+        fragment = load(fragment_yaml)
+
+        real_fragment_name = fragment_class.ansible_name
+        real_collection_name = (
+            ".".join(real_fragment_name.split(".")[0:2]) if "." in real_fragment_name else ""
+        )
+        add_collection_to_versions_and_dates(fragment, real_collection_name, is_module=is_module)
+
+        for key in ("notes", "seealso"):
+            if key in fragment:
+                values = fragment.pop(key)
+                if values:
+                    doc.setdefault(key, []).extend(values)
+
+        if "options" not in fragment and "attributes" not in fragment:
+            raise ValueError(
+                f"missing options or attributes in fragment ({fragment_name}),"
+                f" possibly misformatted?: {filename}"
+            )
+
+        # ensure options themselves are directly merged
+        for doc_key in ("options", "attributes"):
+            if doc_key in fragment:
+                if doc_key in doc:
+                    try:
+                        merge_fragment(doc[doc_key], fragment.pop(doc_key))
+                    except Exception as exc:
+                        raise ValueError(
+                            f"{exc} {doc_key} ({fragment_name}) of unknown type: {filename}"
+                        ) from exc
+                else:
+                    doc[doc_key] = fragment.pop(doc_key)
+
+        # merge rest of the sections
+        try:
+            merge_fragment(doc, fragment)
+        except Exception as exc:
+            raise ValueError(f"{exc} ({fragment_name}) of unknown type: {filename}") from exc
+
+    if unknown_fragments:
+        raise ValueError(
+            f"unknown doc_fragment(s) in file {filename}: {', '.join(unknown_fragments)}"
+        )
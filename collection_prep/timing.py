@@ -0,0 +1,147 @@
+"""Record wall and CPU time per phase and per plugin, and optionally profile a run."""
+import json
+import threading
+import time
+
+from contextlib import contextmanager
+
+
+_local = threading.local()
+RECORDS = []
+# Set by instrument when the timings are written, nothing is recorded otherwise
+ENABLED = False
+
+
+def add_arguments(parser):
+    """Add the --timings and --profile options to a command.
+
+    :param parser: The argument parser of the command
+    """
+    parser.add_argument(
+        "--timings",
+        metavar="FILE",
+        help="Write the wall and CPU time of each phase, per plugin, to FILE as JSON",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="Profile the run with cProfile and write the stats to FILE",
+    )
+
+
+def _records():
+    """Find where the current thread should record its timings.
+
+    :return: The list of records being collected
+    """
+    return getattr(_local, "records", RECORDS)
+
+
+@contextmanager
+def phase(name, plugin=None):
+    """Time a phase of the run.
+
+    CPU time is counted for the current thread only, so it stays accurate in thread
+    workers. Time spent in subprocesses shows in the wall time only. Nothing is
+    recorded unless the timings were requested, or the phase runs in a worker that
+    captures them for its parent.
+
+    :param name: The name of the phase
+    :param plugin: The plugin the phase is run for, if not the one being captured
+    :yield: Nothing
+    """
+    if not ENABLED and not hasattr(_local, "records"):
+        yield
+        return
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    try:
+        yield
+    finally:
+        _records().append(
+            {
+                "phase": name,
+                "plugin": plugin or getattr(_local, "plugin", None),
+                "wall": time.perf_counter() - wall,
+                "cpu": time.thread_time() - cpu,
+            }
+        )
+
+
+@contextmanager
+def capture(plugin):
+    """Collect the timings of the phases run for one plugin.
+
+    The records are kept apart so they can be returned from a worker process and
+    merged with :func:`extend`.
+
+    :param plugin: The plugin the phases are run for
+    :yield: The list the records are collected in
+    """
+    records = []
+    _local.records, _local.plugin = records, plugin
+    try:
+        yield records
+    finally:
+        del _local.records, _local.plugin
+
+
+def extend(records):
+    """Add the records collected in a worker.
+
+    :param records: The records returned by the worker
+    """
+    if ENABLED or hasattr(_local, "records"):
+        _records().extend(records)
+
+
+def report(command, records):
+    """Summarize timing records per phase and per plugin.
+
+    :param command: The name of the command that ran
+    :param records: The timing records
+    :return: The report
+    """
+    phases = {}
+    plugins = {}
+    for record in records:
+        total = phases.setdefault(record["phase"], {"count": 0, "wall": 0.0, "cpu": 0.0})
+        total["count"] += 1
+        total["wall"] += record["wall"]
+        total["cpu"] += record["cpu"]
+        if record["plugin"] is not None:
+            plugin = plugins.setdefault(record["plugin"], {})
+            times = plugin.setdefault(record["phase"], {"wall": 0.0, "cpu": 0.0})
+            times["wall"] += record["wall"]
+            times["cpu"] += record["cpu"]
+    return {"command": command, "phases": phases, "plugins": plugins}
+
+
+@contextmanager
+def instrument(args, command):
+    """Time the whole run and write the timings and profile requested on the command line.
+
+    :param args: The parsed command line, with the timings and profile options
+    :param command: The name of the command
+    :yield: Nothing
+    """
+    global ENABLED  # pylint: disable-msg=global-statement
+
+    ENABLED = bool(args.timings)
+    profiler = None
+    if args.profile:
+        import cProfile  # pylint: disable-msg=import-outside-toplevel
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with phase("total"):
+            yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        if args.timings:
+            with open(args.timings, "w", encoding="utf8") as file_obj:
+                json.dump(report(command, RECORDS), file_obj, indent=2)
+                file_obj.write("\n")
@@ -1,7 +1,9 @@
 """Get ready for 1.0.0."""
+import ast
 import datetime
-
-from redbaron import RedBaron
+import hashlib
+import os
+import shutil
 
 
 COLLECTION_MIN_ANSIBLE_VERSION = ">=2.9"
@@ -29,16 +31,22 @@ def get_removed_at_date():
     return deprecation_date
 
 
-def load_py_as_ast(path):
+def load_py_as_ast(path, data=None):
     """Load a file as an ast object.
 
     :param path: The full path to the file
+    :param data: The contents of the file as on disk, read from path if not given
     :return: The ast object
     """
-    with open(path, encoding="utf8") as file:
-        data = file.read()
-        red = RedBaron(data)
-    return red
+    from redbaron import RedBaron  # pylint: disable-msg=import-outside-toplevel
+
+    if data is None:
+        with open(path, encoding="utf8") as file:
+            data = file.read()
+    else:
+        # Translate the line endings as reading the file in text mode does
+        data = data.replace("\r\n", "\n").replace("\r", "\n")
+    return RedBaron(data)
 
 
 def find_assignment_in_ast(name, ast_file):
@@ -50,3 +58,97 @@ def find_assignment_in_ast(name, ast_file):
     """
     res = ast_file.find("assignment", target=lambda x: x.dumps() == name)
     return res
+
+
+def index_assignments(ast_file):
+    """Index the assignments in an ast object by name, in a single pass.
+
+    Each name maps to its first assignment, the one find_assignment_in_ast would find.
+    The index stays valid when assignment values are replaced, assignments removed
+    from the ast object must be removed from the index as well.
+
+    :param ast_file: The ast object
+    :return: A mapping of assignment names to assignment nodes
+    """
+    index = {}
+    for node in ast_file.find_all("assignment"):
+        index.setdefault(node.target.dumps(), node)
+    return index
+
+
+def read_assignments(path, names):
+    """Read the literal values assigned to top-level names in a python file.
+
+    Unlike load_py_as_ast this is read-only, the file is parsed with the stdlib
+    ast module without building a lossless tree.
+
+    :param path: The full path to the file
+    :param names: The names of the assignments to read
+    :return: A mapping of the names found to their values
+    """
+    with open(path, encoding="utf8") as file:
+        module = ast.parse(file.read(), filename=str(path))
+    found = {}
+    for node in module.body:
+        if isinstance(node, ast.Assign):
+            targets = node.targets
+        elif isinstance(node, ast.AnnAssign) and node.value is not None:
+            targets = [node.target]
+        else:
+            continue
+        for target in targets:
+            if isinstance(target, ast.Name) and target.id in names and target.id not in found:
+                found[target.id] = ast.literal_eval(node.value)
+    return found
+
+
+def user_cache_path(name):
+    """Get the path of a file in the collection_prep user cache directory.
+
+    :param name: The name of the file
+    :return: The path, in $XDG_CACHE_HOME/collection_prep or ~/.cache/collection_prep
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "collection_prep", name)
+
+
+def file_digest(path):
+    """Compute the content hash of a file.
+
+    :param path: The full path to the file
+    :return: The hex encoded sha256 of the file contents
+    """
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def write_if_changed(path, text):
+    """Write text to a file unless the file already holds exactly that text.
+
+    The file is replaced atomically, so readers never see a partial write. A symlink
+    is followed, so the file it points to is replaced and the link kept.
+
+    :param path: The full path to the file
+    :param text: The new contents of the file
+    :return: True if the file was written, False if it was unchanged
+    """
+    path = os.path.realpath(path)
+    try:
+        with open(path, encoding="utf8", newline="") as file:
+            if file.read() == text:
+                return False
+        exists = True
+    except FileNotFoundError:
+        exists = False
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "w", encoding="utf8", newline="") as file:
+            file.write(text)
+        if exists:
+            shutil.copymode(path, temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.lexists(temp_path):
+            os.unlink(temp_path)
+    return True